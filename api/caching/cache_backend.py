@@ -0,0 +1,53 @@
+from abc import ABC, abstractmethod
+
+
+class CacheBackend(ABC):
+    """
+    Interfaccia comune dei backend della cache upstream (vedi UPSTREAM_CACHE in api.constants).
+    Le chiavi sono le tuple prodotte da _cache_key: (url, parametri ordinati, transform).
+    Ogni voce ha una scadenza (TTL) e un periodo di conservazione come dato scaduto ('stale_ttl').
+
+    I metodi *_fill implementano il riempimento atomico tra processi: chi ottiene il lease di una chiave
+    interroga l'upstream e popola la cache, gli altri attendono il risultato invece di ripetere la chiamata.
+    Un backend usato da un solo processo (come TTLCache) concede sempre il lease: lì basta il single-flight.
+    Un backend remoto (es. redis: SET NX PX per il lease, SET PX per le voci) implementa gli stessi metodi:
+    quelli astratti sono obbligatori, e un backend incompleto fallisce già alla creazione.
+    """
+
+    @abstractmethod
+    def get(self, key, default=None):
+        """Restituisce il valore associato a 'key' se presente e non scaduto, altrimenti 'default'."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_with_age(self, key):
+        """Restituisce (valore, età_in_secondi, ancora_valido) oppure None se la voce non è disponibile."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def time_to_expiry(self, key):
+        """Restituisce i secondi mancanti alla scadenza (negativi se scaduta ma conservata) oppure None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key, value, ttl, stale_ttl=0):
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self):
+        raise NotImplementedError
+
+    def acquire_fill(self, key, lease_seconds):
+        """Tenta di ottenere per 'lease_seconds' secondi il diritto esclusivo di popolare 'key'."""
+        return True
+
+    def release_fill(self, key):
+        """Rilascia il lease ottenuto con acquire_fill (anche se la richiesta upstream non è andata a buon fine)."""
+
+    def is_filling(self, key):
+        """Indica se un altro processo detiene un lease ancora valido su 'key'."""
+        return False
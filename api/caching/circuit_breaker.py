@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Interruttore di circuito per un host upstream.
+    Dopo 'failure_threshold' errori consecutivi il circuito si apre e le richieste vengono rifiutate
+    subito per 'reset_timeout' secondi; trascorso questo tempo passa una sola richiesta di prova
+    (semi-aperto): se ha successo il circuito si richiude, altrimenti si riapre.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Indica se una richiesta verso l'host può essere tentata ora."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_progress or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
@@ -0,0 +1,138 @@
+import asyncio
+import heapq
+import math
+import threading
+import time
+
+
+class DecayingTopK:
+    """
+    Contatori di frequenza con decadimento esponenziale: ogni richiesta aggiunge 1 al punteggio della chiave
+    e il punteggio si dimezza ogni 'half_life' secondi senza richieste. Si conservano al più 'capacity'
+    chiavi: superata la soglia vengono scartate quelle con il punteggio attuale più basso.
+    """
+
+    def __init__(self, capacity, half_life):
+        self.capacity = capacity
+        self._decay = math.log(2) / half_life
+        self._scores = {}  # chiave -> (punteggio, istante dell'ultimo aggiornamento)
+        self._lock = threading.Lock()
+
+    def _current(self, score, updated_at, now):
+        return score * math.exp(-self._decay * (now - updated_at))
+
+    def hit(self, key):
+        """Registra una richiesta per 'key'. Restituisce le chiavi scartate per far posto alle nuove."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._scores.get(key)
+            score = self._current(*entry, now) if entry else 0.0
+            self._scores[key] = (score + 1.0, now)
+            if len(self._scores) <= 2 * self.capacity:
+                return []
+            # Potatura a blocchi: si ordina solo quando la tabella raddoppia, non a ogni richiesta.
+            tenute = heapq.nlargest(self.capacity, self._scores.items(),
+                                    key=lambda item: self._current(*item[1], now))
+            tenute = dict(tenute)
+            scartate = [k for k in self._scores if k not in tenute]
+            self._scores = tenute
+            return scartate
+
+    def top(self, n, min_score=0.0):
+        """Restituisce fino a 'n' coppie (chiave, punteggio attuale) in ordine decrescente di punteggio."""
+        now = time.monotonic()
+        with self._lock:
+            items = [(key, self._current(*entry, now)) for key, entry in self._scores.items()]
+        return heapq.nlargest(n, (item for item in items if item[1] >= min_score), key=lambda item: item[1])
+
+    def prune(self, min_score, idle):
+        """
+        Scarta le chiavi il cui punteggio attuale è sceso sotto 'min_score' e che non ricevono richieste
+        da almeno 'idle' secondi (le chiavi appena viste hanno tempo di accumulare punteggio).
+        Restituisce le chiavi scartate.
+        """
+        now = time.monotonic()
+        with self._lock:
+            scartate = [key for key, (score, updated_at) in self._scores.items()
+                        if now - updated_at >= idle and self._current(score, updated_at, now) < min_score]
+            for key in scartate:
+                del self._scores[key]
+        return scartate
+
+    def __len__(self):
+        return len(self._scores)
+
+
+class PrewarmScheduler:
+    """
+    Pianificatore di pre-riscaldamento della cache upstream.
+    Le richieste tracciate alimentano un DecayingTopK; ogni 'interval' secondi un task in background
+    esamina le 'top_n' chiavi più richieste e aggiorna quelle che scadono entro 'lead_fraction' del loro TTL
+    (o già scadute), rispettando un budget di 'budget_per_minute' richieste upstream (token bucket).
+
+    'time_to_expiry(chiave)' restituisce i secondi mancanti alla scadenza in cache (o None);
+    'refresh(spec)' avvia l'aggiornamento della voce descritta da 'spec' senza attenderlo.
+    """
+
+    def __init__(self, time_to_expiry, refresh, top_n=50, budget_per_minute=120, half_life=300,
+                 interval=1.0, lead_fraction=0.2, min_score=2.0):
+        self.counters = DecayingTopK(4 * top_n, half_life)
+        self.half_life = half_life
+        self.time_to_expiry = time_to_expiry
+        self.refresh = refresh
+        self.top_n = top_n
+        self.budget_per_minute = budget_per_minute
+        self.interval = interval
+        self.lead_fraction = lead_fraction
+        self.min_score = min_score
+        self._specs = {}  # chiave -> (spec, ttl) necessari per ripetere la richiesta
+        self._tokens = float(budget_per_minute)
+        self._tokens_at = time.monotonic()
+        self._task = None
+
+    def track(self, key, spec, ttl):
+        """Registra una richiesta per 'key' e avvia il task di pre-riscaldamento se non è già attivo."""
+        self._specs[key] = (spec, ttl)
+        for scartata in self.counters.hit(key):
+            self._specs.pop(scartata, None)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(self.budget_per_minute, self._tokens + (now - self._tokens_at) * self.budget_per_minute / 60)
+        self._tokens_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def tick(self):
+        """Esegue un passo di pianificazione; restituisce il numero di aggiornamenti avviati."""
+        avviati = 0
+        for key, _ in self.counters.top(self.top_n, self.min_score):
+            spec_ttl = self._specs.get(key)
+            if spec_ttl is None:
+                continue
+            spec, ttl = spec_ttl
+            remaining = self.time_to_expiry(key)
+            if remaining is not None and remaining > max(ttl * self.lead_fraction, self.interval):
+                continue  # Ancora valida oltre il prossimo passo: nessun aggiornamento necessario
+            if not self._take_token():
+                break  # Budget esaurito: le chiavi restanti, meno richieste, attendono il prossimo passo
+            self.refresh(spec)
+            avviati += 1
+        return avviati
+
+    async def _run(self):
+        # Il task termina quando nessuna chiave raggiunge più 'min_score': track() lo riavvia alla prossima richiesta.
+        while True:
+            await asyncio.sleep(self.interval)
+            for scartata in self.counters.prune(self.min_score, self.half_life):
+                self._specs.pop(scartata, None)
+            if not self.counters.top(1, self.min_score):
+                break
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Errore nel pre-riscaldamento della cache: {e}")
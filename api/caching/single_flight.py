@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalescenza delle richieste concorrenti identiche ("single-flight").
+    Il primo chiamante per una chiave esegue la funzione; quelli che arrivano mentre
+    è ancora in corso attendono e ricevono lo stesso risultato (o la stessa eccezione).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    Variante di SingleFlight per l'event loop: i chiamanti concorrenti per la stessa chiave
+    attendono lo stesso task senza occupare un thread ciascuno.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, coro_fn):
+        task = self._tasks.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+
+            def forget(finished_task):
+                if self._tasks.get(key) is finished_task:
+                    del self._tasks[key]
+
+            task.add_done_callback(forget)
+        # shield: se un chiamante viene cancellato, la richiesta condivisa prosegue per gli altri.
+        return await asyncio.shield(task)
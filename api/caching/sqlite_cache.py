@@ -0,0 +1,150 @@
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from api.caching.cache_backend import CacheBackend
+
+# Ogni quante scritture (per processo) si rimuovono le voci oltre il periodo di conservazione e quelle in eccesso.
+MAINTENANCE_EVERY = 64
+# Attesa massima (in secondi) su un database bloccato. Le letture arrivano anche dall'event loop
+# (make_request_async, pre-riscaldamento): se il file è bloccato si considera la voce assente invece di attendere.
+READ_BUSY_TIMEOUT = 0.01
+WRITE_BUSY_TIMEOUT = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    evict_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_evict_at ON entries (evict_at);
+CREATE TABLE IF NOT EXISTS fills (
+    key TEXT PRIMARY KEY,
+    lease_until REAL NOT NULL
+);
+"""
+
+
+def _encode_key(key):
+    """Converte la chiave (url, parametri, transform) in una stringa stabile tra processi."""
+    url, params, transform = key
+    transform_name = f"{transform.__module__}.{transform.__qualname__}" if transform is not None else None
+    return repr((url, params, transform_name))
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache condivisa tra i processi (worker uvicorn) dello stesso host, su un file SQLite in modalità WAL:
+    le letture non bloccano le scritture e ogni worker vede subito le voci scritte dagli altri.
+    I tempi sono in secondi di orologio di sistema (time.time), confrontabili tra processi.
+    Oltre 'maxsize' voci vengono rimosse per prime quelle memorizzate da più tempo.
+    I valori sono serializzati con pickle: il file va tenuto in una directory scrivibile solo dall'app.
+    """
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()  # una connessione di scrittura e una di lettura per thread
+        self._writes = itertools.count(1)  # next() è atomico: le scritture arrivano da più thread del pool
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=WRITE_BUSY_TIMEOUT, isolation_level=None)  # autocommit
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _reader(self):
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            reader = self._local.reader = sqlite3.connect(self.path, timeout=READ_BUSY_TIMEOUT, isolation_level=None)
+        return reader
+
+    def _read(self, query, parameters):
+        """Esegue una lettura senza attendere un database bloccato: in quel caso restituisce None (voce assente)."""
+        try:
+            return self._reader().execute(query, parameters).fetchone()
+        except sqlite3.OperationalError as e:
+            print(f"Cache SQLite non leggibile, voce considerata assente: {e}")
+            return None
+
+    def _row(self, key, now):
+        return self._read(
+            "SELECT value, stored_at, expires_at FROM entries WHERE key = ? AND evict_at > ?",
+            (_encode_key(key), now)
+        )
+
+    def get(self, key, default=None):
+        now = time.time()
+        row = self._row(key, now)
+        if row is None or row[2] <= now:
+            return default
+        return pickle.loads(row[0])
+
+    def get_with_age(self, key):
+        now = time.time()
+        row = self._row(key, now)
+        if row is None:
+            return None
+        value, stored_at, expires_at = row
+        return pickle.loads(value), now - stored_at, expires_at > now
+
+    def time_to_expiry(self, key):
+        now = time.time()
+        row = self._read("SELECT expires_at FROM entries WHERE key = ? AND evict_at > ?", (_encode_key(key), now))
+        return row[0] - now if row is not None else None
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        now = time.time()
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (key, value, stored_at, expires_at, evict_at) VALUES (?, ?, ?, ?, ?)",
+            (_encode_key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now, now + ttl, now + ttl + stale_ttl)
+        )
+        if next(self._writes) % MAINTENANCE_EVERY == 0:
+            self._evict(connection, now)
+
+    def _evict(self, connection, now):
+        connection.execute("DELETE FROM entries WHERE evict_at <= ?", (now,))
+        connection.execute("DELETE FROM fills WHERE lease_until <= ?", (now,))
+        connection.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,)
+        )
+
+    def clear(self):
+        connection = self._connection()
+        connection.execute("DELETE FROM entries")
+        connection.execute("DELETE FROM fills")
+
+    def __len__(self):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM entries WHERE evict_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+    def acquire_fill(self, key, lease_seconds):
+        now = time.time()
+        # L'UPSERT è atomico: il lease passa di mano solo se assente o scaduto.
+        cursor = self._connection().execute(
+            "INSERT INTO fills (key, lease_until) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET lease_until = excluded.lease_until WHERE fills.lease_until <= ?",
+            (_encode_key(key), now + lease_seconds, now)
+        )
+        return cursor.rowcount == 1
+
+    def release_fill(self, key):
+        self._connection().execute("DELETE FROM fills WHERE key = ?", (_encode_key(key),))
+
+    def is_filling(self, key):
+        row = self._read("SELECT 1 FROM fills WHERE key = ? AND lease_until > ?", (_encode_key(key), time.time()))
+        return row is not None
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+from api.caching.cache_backend import CacheBackend
+
+
+class TTLCache(CacheBackend):
+    """
+    Cache in memoria con scadenza per voce (TTL) e dimensione massima limitata.
+    Quando la cache è piena viene rimossa la voce usata meno di recente (LRU).
+    Una voce scaduta può essere conservata per un ulteriore periodo ('stale_ttl'), durante il quale
+    è ancora leggibile con get_with_age (stale-while-revalidate) ma non con get.
+    È thread-safe: le richieste upstream possono arrivare da più thread.
+    È il backend predefinito, privato del singolo processo.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # chiave -> (valore, memorizzato_il, scadenza, rimozione)
+        self._lock = threading.Lock()
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[3] <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key, default=None):
+        """Restituisce il valore associato a 'key' se presente e non scaduto, altrimenti 'default'."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(key, now)
+        if entry is None or entry[2] <= now:
+            return default
+        return entry[0]
+
+    def get_with_age(self, key):
+        """
+        Restituisce (valore, età_in_secondi, ancora_valido) anche per una voce scaduta ma ancora
+        nel periodo di conservazione, oppure None se la voce non è disponibile.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lookup(key, now)
+        if entry is None:
+            return None
+        value, stored_at, expires_at, _ = entry
+        return value, now - stored_at, expires_at > now
+
+    def time_to_expiry(self, key):
+        """
+        Restituisce i secondi mancanti alla scadenza di 'key' (negativi se già scaduta ma conservata),
+        oppure None se la voce non è presente. Non modifica l'ordine LRU.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[3] <= now:
+            return None
+        return entry[2] - now
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        """
+        Memorizza 'value' per 'ttl' secondi (più 'stale_ttl' secondi di conservazione come dato scaduto),
+        rimuovendo le voci meno recenti se si supera 'maxsize'.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (value, now, now + ttl, now + ttl + stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
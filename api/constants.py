@@ -1,4 +1,97 @@
+import asyncio
+import contextvars
+import functools
+import os
+import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from api.caching.circuit_breaker import CircuitBreaker
+from api.caching.prewarm import PrewarmScheduler
+from api.caching.single_flight import AsyncSingleFlight, SingleFlight
+from api.caching.sqlite_cache import SQLiteCache
+from api.caching.ttl_cache import TTLCache
+
+# Durata (in secondi) delle risposte upstream in cache, per tipo di endpoint.
+LINES_CACHE_TTL = 6 * 60 * 60  # Elenco dei journey patterns: cambia raramente
+LINE_DETAILS_CACHE_TTL = 10 * 60  # Dettagli di una linea (percorso e fermate)
+STOP_DETAILS_CACHE_TTL = 5  # linesummary di una fermata: contiene i tempi di attesa in tempo reale
+METRO_STATUS_CACHE_TTL = 60  # Stato delle linee metropolitane (home page di atm.it)
+UPSTREAM_CACHE_MAXSIZE = 1024
+
+# Finestra (in secondi, oltre il TTL) in cui un dato scaduto viene ancora servito subito mentre
+# viene aggiornato in background (stale-while-revalidate). Configurabile tramite variabili d'ambiente.
+LINES_STALE_TTL = int(os.environ.get("ONBOARD_LINES_STALE_TTL", str(24 * 60 * 60)))
+LINE_DETAILS_STALE_TTL = int(os.environ.get("ONBOARD_LINE_DETAILS_STALE_TTL", str(60 * 60)))
+METRO_STATUS_STALE_TTL = int(os.environ.get("ONBOARD_METRO_STATUS_STALE_TTL", str(10 * 60)))
+
+# Interruttore di circuito per host: dopo N errori consecutivi l'host non viene interrogato per M secondi.
+UPSTREAM_BREAKER_FAILURES = int(os.environ.get("ONBOARD_UPSTREAM_BREAKER_FAILURES", "5"))
+UPSTREAM_BREAKER_RESET_TIMEOUT = int(os.environ.get("ONBOARD_UPSTREAM_BREAKER_RESET_TIMEOUT", "30"))
+
+# Pre-riscaldamento della cache: le voci più richieste (contatori con decadimento) vengono aggiornate poco
+# prima della scadenza, entro un budget di richieste upstream al minuto. ONBOARD_PREWARM=0 lo disattiva.
+PREWARM_ENABLED = os.environ.get("ONBOARD_PREWARM", "1") not in ("0", "false")
+PREWARM_TOP_N = int(os.environ.get("ONBOARD_PREWARM_TOP_N", "50"))
+PREWARM_BUDGET_PER_MINUTE = int(os.environ.get("ONBOARD_PREWARM_BUDGET_PER_MINUTE", "120"))
+PREWARM_HALF_LIFE = int(os.environ.get("ONBOARD_PREWARM_HALF_LIFE", "300"))
+
+# Backend della cache upstream: "memory" (predefinito, privato di ogni processo) oppure "sqlite",
+# un file condiviso da tutti i worker dello stesso host, che così effettuano una sola richiesta upstream per chiave.
+UPSTREAM_CACHE_BACKEND = os.environ.get("ONBOARD_CACHE_BACKEND", "memory").lower()
+UPSTREAM_CACHE_PATH = os.environ.get("ONBOARD_CACHE_PATH",
+                                     os.path.join(tempfile.gettempdir(), "onboard_upstream_cache.sqlite3"))
+# Intervallo di attesa tra due controlli mentre un altro worker popola la stessa chiave.
+UPSTREAM_FILL_POLL_INTERVAL = 0.05
+
+
+def _create_upstream_cache():
+    if UPSTREAM_CACHE_BACKEND == "memory":
+        return TTLCache(UPSTREAM_CACHE_MAXSIZE)
+    if UPSTREAM_CACHE_BACKEND == "sqlite":
+        return SQLiteCache(UPSTREAM_CACHE_PATH, UPSTREAM_CACHE_MAXSIZE)
+    raise ValueError(f"ONBOARD_CACHE_BACKEND non valido: {UPSTREAM_CACHE_BACKEND!r} (valori ammessi: memory, sqlite)")
+
+
+# Cache condivisa da tutte le richieste servite da questo processo (o da tutti i worker, con il backend sqlite).
+UPSTREAM_CACHE = _create_upstream_cache()
+# Richieste upstream identiche e concorrenti condividono un'unica chiamata in corso.
+UPSTREAM_FLIGHTS = SingleFlight()
+UPSTREAM_ASYNC_FLIGHTS = AsyncSingleFlight()
+UPSTREAM_PREWARM = PrewarmScheduler(
+    UPSTREAM_CACHE.time_to_expiry,
+    lambda spec: _refresh_in_background(*spec),
+    top_n=PREWARM_TOP_N,
+    budget_per_minute=PREWARM_BUDGET_PER_MINUTE,
+    half_life=PREWARM_HALF_LIFE,
+)
+
+# Numero massimo di richieste contemporanee verso lo stesso host upstream e dimensione del pool
+# di connessioni keep-alive riutilizzate tra una richiesta e l'altra.
+UPSTREAM_MAX_CONCURRENCY_PER_HOST = int(os.environ.get("ONBOARD_UPSTREAM_CONCURRENCY_PER_HOST", "8"))
+UPSTREAM_POOL_MAXSIZE = int(os.environ.get("ONBOARD_UPSTREAM_POOL_MAXSIZE", "32"))
+
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=UPSTREAM_POOL_MAXSIZE))
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=UPSTREAM_POOL_MAXSIZE))
+
+# Le chiamate bloccanti di requests vengono eseguite qui, fuori dall'event loop dell'app ASGI.
+_UPSTREAM_EXECUTOR = ThreadPoolExecutor(max_workers=UPSTREAM_POOL_MAXSIZE, thread_name_prefix="upstream")
+_HOST_SEMAPHORES = weakref.WeakKeyDictionary()  # event loop -> {host: asyncio.Semaphore}
+_HOST_BREAKERS = {}  # host -> CircuitBreaker
+_HOST_BREAKERS_LOCK = threading.Lock()
+_REFRESHING = set()  # chiavi di cache con un aggiornamento in background già in corso
+_REFRESHING_LOCK = threading.Lock()
+
+# Età (in secondi) del dato upstream servito dalla cache come scaduto durante la richiesta corrente,
+# o None se il dato è aggiornato. L'app la espone al client con l'header Age.
+UPSTREAM_DATA_AGE = contextvars.ContextVar("upstream_data_age", default=None)
 
 
 def create_error_json(status_code_val, error_key, detail_it):
@@ -23,12 +116,166 @@ def create_local_waiting_time_json(type, value = None):
     }
 
 
-def make_request(url, headers=None, params=None, timeout=15):
+def _cache_key(url, params, transform=None):
+    return url, tuple(sorted(params.items())) if params else (), transform
+
+
+def make_request(url, headers=None, params=None, timeout=15, cache_ttl=None, stale_ttl=0, force_refresh=False,
+                 transform=None):
+    """
+    Esegue una richiesta GET verso l'API upstream.
+    Se 'cache_ttl' è indicato, le risposte con esito positivo vengono memorizzate per quel numero
+    di secondi (chiave: URL e parametri) e riutilizzate dalle richieste successive; 'stale_ttl'
+    prolunga la conservazione del dato scaduto per la logica stale-while-revalidate di make_request_async.
+    Con 'force_refresh' la cache viene ignorata in lettura e aggiornata con la nuova risposta.
+    Se 'transform' è indicato, viene applicato una sola volta ai dati di una risposta con esito positivo
+    e in cache finisce il risultato già elaborato invece della risposta grezza.
+    Le richieste concorrenti per lo stesso URL e parametri attendono un'unica chiamata upstream
+    e ne condividono il risultato.
+    """
+    cache_key = _cache_key(url, params, transform)
+    if cache_ttl and not force_refresh:
+        cached = UPSTREAM_CACHE.get(cache_key)
+        if cached is not None:
+            print(f"Cache hit: {url}, Params: {params}")
+            return cached
+
+    def fetch_and_store():
+        if cache_ttl and not force_refresh:
+            # Un'altra chiamata potrebbe aver appena popolato la cache prima che questa diventasse leader.
+            cached = UPSTREAM_CACHE.get(cache_key)
+            if cached is not None:
+                return cached
+        owns_lease = bool(cache_ttl) and UPSTREAM_CACHE.acquire_fill(cache_key, timeout + 5)
+        if cache_ttl and not owns_lease:
+            # Un altro worker sta già interrogando l'upstream per questa chiave: se ne attende il risultato.
+            cached = _wait_for_fill(cache_key)
+            if cached is not None:
+                return cached
+        try:
+            result = _fetch(url, headers=headers, params=params, timeout=timeout)
+            if transform is not None and result[2] == 200:
+                result = transform(result[0]), result[1], result[2]
+            if cache_ttl and result[2] == 200:
+                UPSTREAM_CACHE.set(cache_key, result, cache_ttl, stale_ttl)
+        finally:
+            if owns_lease:
+                UPSTREAM_CACHE.release_fill(cache_key)
+        return result
+
+    return UPSTREAM_FLIGHTS.do(cache_key, fetch_and_store)
+
+
+def _wait_for_fill(cache_key):
+    """
+    Attende che il detentore del lease su 'cache_key' popoli la cache e ne restituisce il valore.
+    Restituisce None se il lease viene rilasciato senza un valore (es. errore upstream) o scade:
+    in quel caso il chiamante interroga l'upstream a sua volta.
+    """
+    while UPSTREAM_CACHE.is_filling(cache_key):
+        time.sleep(UPSTREAM_FILL_POLL_INTERVAL)
+        cached = UPSTREAM_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+    return UPSTREAM_CACHE.get(cache_key)
+
+
+def _refresh_in_background(url, headers, params, timeout, cache_ttl, stale_ttl, transform):
+    """Aggiorna una voce di cache scaduta nel pool upstream, senza far attendere il chiamante."""
+    cache_key = _cache_key(url, params, transform)
+    with _REFRESHING_LOCK:
+        if cache_key in _REFRESHING:
+            return
+        _REFRESHING.add(cache_key)
+
+    def refresh():
+        try:
+            make_request(url, headers=headers, params=params, timeout=timeout, cache_ttl=cache_ttl,
+                         stale_ttl=stale_ttl, force_refresh=True, transform=transform)
+        finally:
+            with _REFRESHING_LOCK:
+                _REFRESHING.discard(cache_key)
+
+    _UPSTREAM_EXECUTOR.submit(refresh)
+
+
+def _host_breaker(url):
+    host = urlsplit(url).netloc
+    with _HOST_BREAKERS_LOCK:
+        breaker = _HOST_BREAKERS.get(host)
+        if breaker is None:
+            breaker = _HOST_BREAKERS[host] = CircuitBreaker(UPSTREAM_BREAKER_FAILURES, UPSTREAM_BREAKER_RESET_TIMEOUT)
+    return breaker
+
+
+def _host_semaphore(url):
+    loop_semaphores = _HOST_SEMAPHORES.setdefault(asyncio.get_running_loop(), {})
+    host = urlsplit(url).netloc
+    semaphore = loop_semaphores.get(host)
+    if semaphore is None:
+        semaphore = loop_semaphores[host] = asyncio.Semaphore(UPSTREAM_MAX_CONCURRENCY_PER_HOST)
+    return semaphore
+
+
+async def make_request_async(url, headers=None, params=None, timeout=15, cache_ttl=None, stale_ttl=0,
+                             transform=None, prewarm=False):
+    """
+    Versione non bloccante di make_request per i gestori dell'app ASGI.
+    I risultati in cache vengono restituiti direttamente dall'event loop; altrimenti la richiesta
+    viene eseguita nel pool di thread dedicato, rispettando il limite di concorrenza per host.
+    Le richieste identiche e concorrenti attendono un unico task.
+    Con 'stale_ttl', un dato scaduto da meno di 'stale_ttl' secondi viene restituito subito
+    (impostando UPSTREAM_DATA_AGE) mentre viene aggiornato in background.
+    'transform' ha lo stesso significato che in make_request e viene eseguito nel pool di thread.
+    Con 'prewarm' la richiesta viene conteggiata da UPSTREAM_PREWARM, che manterrà la voce in cache
+    aggiornata finché resta tra le più richieste.
+    """
+    cache_key = _cache_key(url, params, transform)
+    if prewarm and cache_ttl and PREWARM_ENABLED:
+        UPSTREAM_PREWARM.track(cache_key, (url, headers, params, timeout, cache_ttl, stale_ttl, transform), cache_ttl)
+    if cache_ttl:
+        cached = UPSTREAM_CACHE.get_with_age(cache_key)
+        if cached is not None:
+            value, age, fresh = cached
+            if fresh:
+                print(f"Cache hit: {url}, Params: {params}")
+                return value
+            if stale_ttl:
+                print(f"Cache hit (dato scaduto da aggiornare, età {age:.0f}s): {url}, Params: {params}")
+                UPSTREAM_DATA_AGE.set(int(age))
+                _refresh_in_background(url, headers, params, timeout, cache_ttl, stale_ttl, transform)
+                return value
+
+    async def fetch():
+        async with _host_semaphore(url):
+            return await asyncio.get_running_loop().run_in_executor(
+                _UPSTREAM_EXECUTOR,
+                functools.partial(make_request, url, headers=headers, params=params, timeout=timeout,
+                                  cache_ttl=cache_ttl, stale_ttl=stale_ttl, transform=transform)
+            )
+
+    return await UPSTREAM_ASYNC_FLIGHTS.do(cache_key, fetch)
+
+
+def _fetch(url, headers=None, params=None, timeout=15):
+    breaker = _host_breaker(url)
+    if not breaker.allow():
+        # L'host ha accumulato troppi errori consecutivi: si risponde subito invece di attendere il timeout
+        error_msg = {
+            "code": 503,
+            "error": "UPSTREAM_UNAVAILABLE",
+            "details": "Upstream temporarily unavailable after repeated failures"
+        }
+        print(f"Circuito aperto, richiesta non inviata: {url}")
+        return error_msg, "application/json", 503
+
     try:
         print(f"Fetching URL: {url}, Params: {params}")  # Log request details
         # The 'params' dictionary is automatically converted to query string by requests
-        response = requests.get(url, headers=headers, params=params, timeout=timeout)
+        # La sessione condivisa mantiene aperte le connessioni (keep-alive) verso gli host upstream
+        response = _SESSION.get(url, headers=headers, params=params, timeout=timeout)
         response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+        breaker.record_success()
 
         # Try parsing as JSON first, as it's the most common API response type
         try:
@@ -42,6 +289,7 @@ def make_request(url, headers=None, params=None, timeout=15):
         return data, content_type, response.status_code
 
     except requests.exceptions.Timeout:
+        breaker.record_failure()
         error_msg = {
             "code": 504,
             "error": "REQUEST_TIMEOUT",
@@ -51,6 +299,11 @@ def make_request(url, headers=None, params=None, timeout=15):
         return error_msg, "application/json", 504  # Gateway Timeout
     except requests.exceptions.HTTPError as e:
         # Handle errors reported by the target API (e.g., 404 Not Found, 401 Unauthorized)
+        # Solo gli errori 5xx indicano un upstream in difficoltà; un 4xx è comunque una risposta valida
+        if e.response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
         error_msg = {
             "code": 502,
             "error": "BAD_GATEWAY",
@@ -62,6 +315,7 @@ def make_request(url, headers=None, params=None, timeout=15):
         return error_msg, "application/json", 502
     except requests.exceptions.RequestException as e:
         # Handle broader network issues (DNS failure, connection refused, etc.)
+        breaker.record_failure()
         error_msg = {
             "code": 502,
             "error": "BAD_GATEWAY",
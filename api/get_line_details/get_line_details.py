@@ -3,21 +3,73 @@
 # Does it work? YES
 # Will i do *ANYTHING* to rewrite it? NO
 
+import zlib
 
+from api.parsing.fields import project_fields
 from api.parsing.lines.parse_line import parse_line
-from api.constants import make_request, GIROMILANO_HEADERS
+from api.parsing.lines.encode_geometry import GEOMETRY_MODES, GEOMETRY_PRECISION, encode_geometry
+from api.constants import make_request_async, GIROMILANO_HEADERS, LINE_DETAILS_CACHE_TTL, LINE_DETAILS_STALE_TTL, \
+    create_error_json
+from api.snapshot.line_snapshot import get_line_snapshot
 
 
-def get_line_details(line_id, params=None):
+async def get_line_details(line_id, params=None, geometry="full", simplify=None, fields=None):
     if not line_id:
         return {"error": "Line ID is required in the path"}, "application/json", 400
 
-    url = f"https://giromilano.atm.it/proxy.tpportal/api/tpportal/tpl/journeyPatterns/{line_id}"
+    # Modalità di output della geometria: "full" (punti originali), "polyline", "delta" o "none"
+    geometry = (geometry or "full").lower()
+    if geometry not in GEOMETRY_MODES:
+        errore = create_error_json(
+            400,
+            "BAD_REQUEST",
+            f"Il parametro 'geometry' deve essere uno tra: {', '.join(GEOMETRY_MODES)}."
+        )
+        return errore, "application/json", 400
+    try:
+        tolleranza = float(simplify) if simplify is not None else None
+        if tolleranza is not None and not tolleranza >= 0:  # Esclude anche NaN
+            raise ValueError(simplify)
+    except ValueError:
+        errore = create_error_json(
+            400,
+            "BAD_REQUEST",
+            "Il parametro 'simplify' deve essere una tolleranza in metri non negativa."
+        )
+        return errore, "application/json", 400
 
-    data, content_type, status_code = make_request(url, headers=GIROMILANO_HEADERS, params=params)
+    # La topologia del percorso principale viene dallo snapshot offline, se disponibile: nessuna richiesta upstream.
+    # Le varianti (alternativeRoutesMode=true) e le linee assenti dallo snapshot restano live.
+    snapshot = get_line_snapshot()
+    transformed_data = None
+    if snapshot is not None and (params or {}).get("alternativeRoutesMode", "false") == "false":
+        try:
+            transformed_data = snapshot.get(line_id)
+        except (zlib.error, ValueError) as e:
+            # Blocco danneggiato: la linea viene richiesta all'API upstream come se non fosse nello snapshot.
+            print(f"Attenzione: blocco della linea {line_id} non leggibile nello snapshot: {e}")
 
-    if status_code == 200:
-        transformed_data = parse_line(data)
-        return transformed_data, content_type, status_code
-    return data, content_type, status_code
+    if transformed_data is not None:
+        content_type, status_code = "application/json", 200
+        if geometry == "none":
+            transformed_data["details"]["geometry"] = []
+        if fields is not None:
+            transformed_data = project_fields(transformed_data, fields)
+    else:
+        url = f"https://giromilano.atm.it/proxy.tpportal/api/tpportal/tpl/journeyPatterns/{line_id}"
+
+        data, content_type, status_code = await make_request_async(url, headers=GIROMILANO_HEADERS, params=params,
+                                                                   cache_ttl=LINE_DETAILS_CACHE_TTL,
+                                                                   stale_ttl=LINE_DETAILS_STALE_TTL, prewarm=True)
+        if status_code != 200:
+            return data, content_type, status_code
+        transformed_data = parse_line(data, include_geometry=geometry != "none", fields=fields)
+
+    if transformed_data and "geometry" in transformed_data.get("details", {}) and (geometry != "full" or tolleranza):
+        transformed_data["details"]["geometry"] = encode_geometry(
+            transformed_data["details"]["geometry"], geometry, tolleranza
+        )
+        if geometry in ("polyline", "delta"):
+            transformed_data["details"]["geometryEncoding"] = {"type": geometry, "precision": GEOMETRY_PRECISION}
+    return transformed_data, content_type, status_code
 
@@ -0,0 +1,31 @@
+from api.constants import create_error_json
+from api.get_stops.stops_store import get_stops_store
+from api.snapshot.reverse_index import get_line_stop_index
+
+
+def get_line_stops(line_id):
+    """
+    Restituisce le fermate di una linea (JourneyPatternId) nell'ordine del percorso,
+    dagli indici inversi dello snapshot e dallo stops store: nessuna richiesta upstream.
+
+    Restituisce:
+        tuple: (data, content_type, status_code)
+    """
+    index = get_line_stop_index()
+    if index is None:
+        errore = create_error_json(
+            503,
+            "SNAPSHOT_UNAVAILABLE",
+            "Lo snapshot delle linee non è disponibile su questo server."
+        )
+        return errore, "application/json", 503
+
+    codici = index.stops_of_line(line_id)
+    if codici is None:
+        errore = create_error_json(404, "NOT_FOUND", f"Linea {line_id} non trovata nello snapshot.")
+        return errore, "application/json", 404
+
+    store = get_stops_store()
+    # Le fermate assenti da onboard_stops.json vengono riportate con il solo codice.
+    fermate = [store.get(codice) or {"info": {"id": codice}} for codice in codici]
+    return fermate, "application/json", 200
@@ -1,18 +1,25 @@
-from api.parsing.lines.parse_line import parse_line
+from api.parsing.lines.parse_line import line_description_cache_info, parse_line
+from api.response.pagination import paginate, parse_page_params
+from api.response.streaming import StreamingBody, parse_stream_param
 
 # Si presume che api.constants fornisca make_request e GIROMILANO_HEADERS.
 # Se api.constants non esiste o non fornisce questi elementi, questo import
 # dovrà essere modificato o tali costanti dovranno essere definite/mantenute localmente.
-from api.constants import make_request, GIROMILANO_HEADERS, create_error_json
+from api.constants import make_request_async, GIROMILANO_HEADERS, LINES_CACHE_TTL, LINES_STALE_TTL, create_error_json
 
 # API_URL è specifico per il recupero di tutti i percorsi di linea (journey patterns)
 API_URL = "https://giromilano.atm.it/proxy.tpportal/api/tpportal/tpl/journeyPatterns/"
 
-def get_lines(): # Rinominato per coerenza con l'uso in api/index.py
+async def get_lines(fields=None, limit=None, cursor=None, stream=None): # Rinominato per coerenza con l'uso in api/index.py
     """
     Recupera i dati delle linee dall'API ATM Giromilano utilizzando un gestore
     di richieste condiviso, li elabora e applica una gestione degli errori standardizzata.
 
+    Args:
+        fields (dict): Selezione opzionale dei campi (vedi api.parsing.fields.parse_fields).
+        limit (str), cursor (str): Paginazione opzionale; la risposta diventa {"items": [...], "nextCursor": ...}.
+        stream (str): Se indicato ("1"/"json" o "ndjson"), le linee vengono elaborate e inviate a blocchi.
+
     Restituisce:
         tuple: Una tupla contenente:
             - data (list o dict): I dati delle linee elaborati come lista di dizionari,
@@ -20,10 +27,24 @@ def get_lines(): # Rinominato per coerenza con l'uso in api/index.py
             - content_type (str): Il tipo di contenuto, tipicamente "application/json".
             - status_code (int): Il codice di stato HTTP.
     """
+    pagina = None
+    if limit is not None or cursor is not None:
+        try:
+            pagina = parse_page_params(limit, cursor)
+        except ValueError:
+            errore = create_error_json(
+                400,
+                "BAD_REQUEST",
+                "I parametri 'limit' e 'cursor' devono essere numeri interi (limit positivo)."
+            )
+            return errore, "application/json", 400
+
     # Chiama la funzione condivisa make_request
     # GIROMILANO_HEADERS è importato da api.constants
     # Il timeout è gestito dal valore predefinito di make_request o può essere passato se necessario
-    data, content_type, status_code = make_request(API_URL, headers=GIROMILANO_HEADERS)
+    data, content_type, status_code = await make_request_async(API_URL, headers=GIROMILANO_HEADERS,
+                                                               cache_ttl=LINES_CACHE_TTL,
+                                                               stale_ttl=LINES_STALE_TTL)
 
     if status_code == 200:
         # A questo punto, data dovrebbe essere il JSON analizzato dall'API upstream
@@ -40,7 +61,6 @@ def get_lines(): # Rinominato per coerenza con l'uso in api/index.py
             )
             return errore, "application/json", 502
 
-        linee_elaborate = []
         journey_patterns_list = data.get("JourneyPatterns")
 
         if not isinstance(journey_patterns_list, list):
@@ -52,23 +72,39 @@ def get_lines(): # Rinominato per coerenza con l'uso in api/index.py
             )
             return errore, "application/json", 502
 
-        # Per rispecchiare get_line_details.py, le eccezioni durante parse_line si propagheranno.
-        # Se si desidera una gestione degli errori locale più robusta per il parsing,
-        # un blocco try-except potrebbe essere aggiunto attorno a questo ciclo o alla chiamata parse_line.
-        for pattern_item in journey_patterns_list:
-            if not isinstance(pattern_item, dict):
-                # Opzionalmente, registra o gestisci elementi malformati nella lista
-                print(f"Attenzione: elemento saltato in JourneyPatterns perché non è un dizionario: {pattern_item}")
-                continue  # Salta elementi non dizionario
-
-            # line_details_raw = pattern_item.get("Line") # Questa variabile non era usata ulteriormente (codice morto rimosso)
-            elemento_elaborato = parse_line(pattern_item)
-            if elemento_elaborato:  # parse_line restituisce None per elementi saltati o non validi
-                linee_elaborate.append(elemento_elaborato)
-
-        return linee_elaborate, "application/json", 200
+        linee_elaborate = _parse_lines(journey_patterns_list, fields)
+
+        if pagina is not None:
+            # Le linee oltre la pagina richiesta non vengono nemmeno elaborate.
+            return paginate(linee_elaborate, *pagina), "application/json", 200
+
+        stream_format = parse_stream_param(stream)
+        if stream_format:
+            body = StreamingBody(linee_elaborate, stream_format)
+            return body, body.content_type, 200
+
+        return list(linee_elaborate), "application/json", 200
     else:
         # Se status_code non è 200, data da make_request è già
         # il payload di errore standardizzato (assumendo che make_request lo faccia).
         # content_type dovrebbe essere "application/json" in caso di errore da make_request.
-        return data, content_type, status_code
\ No newline at end of file
+        return data, content_type, status_code
+
+
+def _parse_lines(journey_patterns_list, fields):
+    """Generatore che elabora i journey pattern uno alla volta, nell'ordine dell'API upstream."""
+    # Per rispecchiare get_line_details.py, le eccezioni durante parse_line si propagheranno.
+    # Se si desidera una gestione degli errori locale più robusta per il parsing,
+    # un blocco try-except potrebbe essere aggiunto attorno a questo ciclo o alla chiamata parse_line.
+    for pattern_item in journey_patterns_list:
+        if not isinstance(pattern_item, dict):
+            # Opzionalmente, registra o gestisci elementi malformati nella lista
+            print(f"Attenzione: elemento saltato in JourneyPatterns perché non è un dizionario: {pattern_item}")
+            continue  # Salta elementi non dizionario
+
+        # L'elenco non mostra fermate né geometria: si usa la variante leggera di parse_line
+        elemento_elaborato = parse_line(pattern_item, include_stops=False, include_geometry=False,
+                                        fields=fields)
+        if elemento_elaborato:  # parse_line restituisce None per elementi saltati o non validi
+            yield elemento_elaborato
+    print(f"Cache delle descrizioni di linea: {line_description_cache_info()}")
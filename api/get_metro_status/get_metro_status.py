@@ -1,10 +1,14 @@
-from api.constants import make_request
+from api.constants import make_request_async, METRO_STATUS_CACHE_TTL, METRO_STATUS_STALE_TTL
 from api.parsing.metro.parse_metro_status import parse_metro_status
 
 
-def get_metro_status():
+async def get_metro_status():
     url = "https://www.atm.it/it/Pagine/default.aspx"
-    data, content_type, status_code = make_request(url)
+    # La pagina viene scaricata e analizzata al massimo una volta per intervallo: in cache finisce
+    # solo lo stato già estratto, non l'intera home page.
+    data, content_type, status_code = await make_request_async(url, cache_ttl=METRO_STATUS_CACHE_TTL,
+                                                               stale_ttl=METRO_STATUS_STALE_TTL,
+                                                               transform=parse_metro_status)
     if status_code == 200:
-        return parse_metro_status(data), "application/json", 200
+        return data, "application/json", 200
     return data, content_type, status_code
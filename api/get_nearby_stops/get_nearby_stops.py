@@ -0,0 +1,53 @@
+import math
+
+from api.constants import create_error_json
+from api.get_stops.spatial_index import get_stops_spatial_index
+
+DEFAULT_RADIUS_M = 500
+MAX_RADIUS_M = 5000
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+
+def get_nearby_stops(lat, lon, radius=None, limit=None):
+    """
+    Restituisce le fermate più vicine al punto (lat, lon) entro 'radius' metri,
+    ordinate per distanza e limitate a 'limit' risultati.
+    I parametri arrivano come stringhe dalla query string e vengono validati qui.
+
+    Restituisce:
+        tuple: (data, content_type, status_code)
+    """
+    try:
+        lat = float(lat)
+        lon = float(lon)
+        radius = float(radius) if radius is not None else DEFAULT_RADIUS_M
+        limit = int(limit) if limit is not None else DEFAULT_LIMIT
+    except (TypeError, ValueError):
+        errore = create_error_json(
+            400,
+            "BAD_REQUEST",
+            "I parametri 'lat' e 'lon' sono obbligatori e, come 'radius' e 'limit', devono essere numerici."
+        )
+        return errore, "application/json", 400
+
+    # NaN supera qualsiasi confronto: i valori non finiti vanno esclusi esplicitamente.
+    if not all(math.isfinite(value) for value in (lat, lon, radius)) \
+            or not (-90 <= lat <= 90 and -180 <= lon <= 180) or radius <= 0 or limit <= 0:
+        errore = create_error_json(
+            400,
+            "BAD_REQUEST",
+            "Coordinate fuori intervallo oppure 'radius'/'limit' non positivi."
+        )
+        return errore, "application/json", 400
+
+    radius = min(radius, MAX_RADIUS_M)
+    limit = min(limit, MAX_LIMIT)
+
+    fermate_vicine = []
+    for distance, stop in get_stops_spatial_index().nearest(lat, lon, radius, limit):
+        # Il dizionario è costruito dallo stops store per questa risposta: si può arricchire direttamente.
+        stop["distance"] = round(distance, 1)
+        fermate_vicine.append(stop)
+
+    return fermate_vicine, "application/json", 200
@@ -5,18 +5,19 @@
 
 
 from api.parsing.stops.parse_stop import parse_stop
-from api.constants import make_request, GIROMILANO_HEADERS
+from api.constants import make_request_async, GIROMILANO_HEADERS, STOP_DETAILS_CACHE_TTL
 
 
-def get_stop_details(stop_id, params=None):
+async def get_stop_details(stop_id, params=None, fields=None, prewarm=True):
     if not stop_id:
         return {"error": "Stop ID is required in the path"}, "application/json", 400
 
     url = f"https://giromilano.atm.it/proxy.tpportal/api/tpPortal/tpl/stops/{stop_id}/linesummary"
 
-    data, content_type, status_code = make_request(url, headers=GIROMILANO_HEADERS, params=params)
+    data, content_type, status_code = await make_request_async(url, headers=GIROMILANO_HEADERS, params=params,
+                                                               cache_ttl=STOP_DETAILS_CACHE_TTL, prewarm=prewarm)
 
     if status_code == 200:
-        transformed_data = parse_stop(data)
+        transformed_data = parse_stop(data, fields=fields)
         return transformed_data, content_type, status_code
     return data, content_type, status_code
\ No newline at end of file
@@ -0,0 +1,33 @@
+from api.constants import create_error_json
+from api.get_stops.stops_store import get_stops_store
+from api.snapshot.reverse_index import get_line_stop_index
+
+
+def get_stop_lines(stop_id):
+    """
+    Restituisce la fermata (dallo stops store) con l'elenco delle linee che la servono,
+    ricavato dagli indici inversi dello snapshot delle linee: nessuna richiesta upstream.
+    Le linee non contengono tempi di attesa: per quelli si usa /stops/{stopId}.
+
+    Restituisce:
+        tuple: (data, content_type, status_code)
+    """
+    index = get_line_stop_index()
+    if index is None:
+        errore = create_error_json(
+            503,
+            "SNAPSHOT_UNAVAILABLE",
+            "Lo snapshot delle linee non è disponibile su questo server."
+        )
+        return errore, "application/json", 503
+
+    fermata = get_stops_store().get(stop_id)
+    linee = index.lines_at_stop(stop_id)
+    if fermata is None:
+        if not linee:
+            errore = create_error_json(404, "NOT_FOUND", f"Fermata {stop_id} non trovata.")
+            return errore, "application/json", 404
+        fermata = {"info": {"id": stop_id}}  # Fermata servita da una linea ma assente da onboard_stops.json
+
+    fermata["lines"] = linee
+    return fermata, "application/json", 200
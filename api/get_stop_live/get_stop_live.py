@@ -0,0 +1,28 @@
+from api.constants import create_error_json
+from api.live.stop_poller import watch_stop
+from api.response.sse import EventStreamBody
+
+
+def get_stop_live(stop_id):
+    """
+    Apre un flusso server-sent events con i tempi di attesa della fermata.
+    Tutti i client della stessa fermata condividono un'unica interrogazione periodica dell'API upstream.
+
+    Restituisce:
+        tuple: (data, content_type, status_code)
+    """
+    if not stop_id:
+        errore = create_error_json(400, "BAD_REQUEST", "L'ID della fermata è obbligatorio.")
+        return errore, "application/json", 400
+
+    events = watch_stop(stop_id)
+    if events is None:
+        errore = create_error_json(
+            503,
+            "TOO_MANY_LIVE_STOPS",
+            "Troppe fermate osservate contemporaneamente su questo server: riprova più tardi."
+        )
+        return errore, "application/json", 503
+
+    body = EventStreamBody(events)
+    return body, body.content_type, 200
@@ -1,9 +1,64 @@
-import json
+import math
 
+from api.constants import create_error_json
+from api.get_stops.spatial_index import get_stops_spatial_index
+from api.get_stops.stops_store import get_stops_static_body, get_stops_store
+from api.response.pagination import paginate, parse_page_params
+from api.response.streaming import StreamingBody, parse_stream_param
 
-def get_stops():
-    with open("api/get_stops/onboard_stops.json", 'r') as f:
-        data = json.load(f)
-        content_type = "application/json"
-        status_code = 200
-        return data, content_type, status_code
+
+def get_stops(limit=None, cursor=None, stream=None, bbox=None):
+    """
+    Restituisce l'elenco statico delle fermate.
+    Con 'bbox' ("minLon,minLat,maxLon,maxLat") solo quelle dentro il rettangolo, tramite l'indice spaziale.
+    Con 'limit'/'cursor' restituisce una pagina {"items": [...], "nextCursor": ...};
+    con 'stream' l'elenco viene inviato a blocchi (array JSON oppure NDJSON).
+
+    Restituisce:
+        tuple: (data, content_type, status_code)
+    """
+    store = get_stops_store()
+    fermate = store
+    if bbox is not None:
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+            if not all(math.isfinite(value) for value in (min_lon, min_lat, max_lon, max_lat)):
+                raise ValueError("bbox non finito")
+        except ValueError:
+            errore = create_error_json(
+                400,
+                "BAD_REQUEST",
+                "Il parametro 'bbox' deve essere nella forma 'minLon,minLat,maxLon,maxLat'."
+            )
+            return errore, "application/json", 400
+        if min_lon > max_lon or min_lat > max_lat:
+            errore = create_error_json(400, "BAD_REQUEST", "Nel parametro 'bbox' i valori minimi superano i massimi.")
+            return errore, "application/json", 400
+        indici = get_stops_spatial_index().within_bbox(min_lon, min_lat, max_lon, max_lat)
+        fermate = [store.stop(index) for index in indici]
+
+    if limit is not None or cursor is not None:
+        try:
+            limit, offset = parse_page_params(limit, cursor)
+        except ValueError:
+            errore = create_error_json(
+                400,
+                "BAD_REQUEST",
+                "I parametri 'limit' e 'cursor' devono essere numeri interi (limit positivo)."
+            )
+            return errore, "application/json", 400
+        return paginate(fermate, limit, offset), "application/json", 200
+
+    stream_format = parse_stream_param(stream)
+    if stream_format:
+        body = StreamingBody(fermate, stream_format)
+        return body, body.content_type, 200
+
+    if bbox is not None:
+        return fermate, "application/json", 200
+
+    # Il file statico viene letto e serializzato una sola volta: qui si restituisce il corpo già pronto.
+    data = get_stops_static_body()
+    content_type = "application/json"
+    status_code = 200
+    return data, content_type, status_code
@@ -0,0 +1,161 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+
+from api.get_stops.stops_store import get_stops_store
+
+# Abbreviazioni toponomastiche presenti nei nomi delle fermate ATM, espanse sia nell'indice che nelle query.
+ABBREVIAZIONI = {
+    "v.le": "viale",
+    "p.le": "piazzale",
+    "p.za": "piazza",
+    "c.so": "corso",
+    "l.go": "largo",
+    "p.ta": "porta",
+    "p.te": "ponte",
+    "m.te": "monte",
+    "q.re": "quartiere",
+    "f.lli": "fratelli",
+    "staz.": "stazione",
+    "osp.": "ospedale",
+    "ist.": "istituto",
+    "vitt.": "vittorio",
+}
+_ABBREVIAZIONI_RE = re.compile(
+    r"(?<![a-z0-9])(" + "|".join(re.escape(a) for a in sorted(ABBREVIAZIONI, key=len, reverse=True)) + r")(?:(?<=\.)|(?![a-z0-9]))"
+)
+_NON_ALFANUMERICI_RE = re.compile(r"[^a-z0-9]+")
+
+# Soglia minima di similarità (indice di Jaccard sui trigrammi) per i risultati approssimati.
+SOGLIA_FUZZY = 0.3
+
+
+def normalize_name(name):
+    """
+    Normalizza un nome di fermata o una query: minuscole, senza accenti,
+    abbreviazioni espanse (V.Le -> viale) e punteggiatura ridotta a spazi singoli.
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c)).lower()
+    name = _ABBREVIAZIONI_RE.sub(lambda m: " " + ABBREVIAZIONI[m.group(1)] + " ", name)
+    return _NON_ALFANUMERICI_RE.sub(" ", name).strip()
+
+
+def _trigrams(normalized):
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class StopsSearchIndex:
+    """
+    Indice di ricerca per nome sulle fermate statiche.
+    I nomi normalizzati distinti sono indicizzati due volte: un array ordinato di parole
+    (ricerca per prefisso con bisect) e una mappa trigramma -> nomi (ricerca approssimata).
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.names = []  # nomi normalizzati distinti
+        self.name_stops = []  # per ogni nome, gli indici delle fermate che lo portano
+        name_ids = {}
+
+        for index in range(len(store)):
+            raw_name = store.name_of(index)
+            if not isinstance(raw_name, str):
+                continue
+            normalized = normalize_name(raw_name)
+            if not normalized:
+                continue
+            name_id = name_ids.get(normalized)
+            if name_id is None:
+                name_id = name_ids[normalized] = len(self.names)
+                self.names.append(normalized)
+                self.name_stops.append([])
+            self.name_stops[name_id].append(index)
+
+        token_names = {}
+        self.trigrams = {}
+        for name_id, normalized in enumerate(self.names):
+            for token in normalized.split():
+                token_names.setdefault(token, set()).add(name_id)
+            for trigram in _trigrams(normalized):
+                self.trigrams.setdefault(trigram, []).append(name_id)
+
+        self.tokens = sorted(token_names)
+        self.token_names = [token_names[token] for token in self.tokens]
+        self.name_trigram_counts = [len(_trigrams(normalized)) for normalized in self.names]
+
+    def _names_with_token_prefix(self, prefix):
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + "\uffff", start)
+        if end - start == 1:
+            return self.token_names[start]
+        result = set()
+        for name_set in self.token_names[start:end]:
+            result |= name_set
+        return result
+
+    def _prefix_matches(self, query):
+        """Nomi in cui ogni parola della query è prefisso di almeno una parola del nome."""
+        matches = None
+        for token in query.split():
+            names = self._names_with_token_prefix(token)
+            matches = set(names) if matches is None else matches & names
+            if not matches:
+                return set()
+        return matches or set()
+
+    def _fuzzy_matches(self, query):
+        """Nomi simili alla query secondo l'indice di Jaccard sui trigrammi, con il relativo punteggio."""
+        query_trigrams = _trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self.trigrams.get(trigram, ()))
+        scores = {}
+        for name_id, common in shared.items():
+            score = common / (len(query_trigrams) + self.name_trigram_counts[name_id] - common)
+            if score >= SOGLIA_FUZZY:
+                scores[name_id] = score
+        return scores
+
+    def search(self, query, limit):
+        """
+        Restituisce fino a 'limit' fermate il cui nome corrisponde alla query.
+        Prima le corrispondenze per prefisso (nome identico, poi nome che inizia con la query,
+        poi le altre, a parità i nomi più corti), poi quelle approssimate per similarità decrescente.
+        """
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        prefix_ids = self._prefix_matches(query)
+        # Ogni nome porta almeno una fermata: bastano i primi 'limit' nomi, senza ordinare tutto l'insieme.
+        ranked = heapq.nsmallest(
+            limit,
+            prefix_ids,
+            key=lambda n: (self.names[n] != query, not self.names[n].startswith(query), len(self.names[n]), self.names[n])
+        )
+
+        if sum(len(self.name_stops[n]) for n in ranked) < limit:
+            fuzzy = self._fuzzy_matches(query)
+            ranked.extend(sorted(
+                (n for n in fuzzy if n not in prefix_ids),
+                key=lambda n: (-fuzzy[n], len(self.names[n]), self.names[n])
+            ))
+
+        results = []
+        for name_id in ranked:
+            for index in self.name_stops[name_id]:
+                results.append(self.store.stop(index))
+                if len(results) >= limit:
+                    return results
+        return results
+
+
+@lru_cache(maxsize=None)
+def get_stops_search_index():
+    """Costruisce l'indice di ricerca per nome una sola volta per processo a partire dallo stops store."""
+    return StopsSearchIndex(get_stops_store())
@@ -0,0 +1,105 @@
+import heapq
+import math
+from functools import lru_cache
+
+from api.get_stops.stops_store import get_stops_store
+
+# Lato di una cella della griglia in gradi (~550 m in latitudine a Milano).
+GRID_CELL_SIZE_DEG = 0.005
+METERS_PER_DEG_LAT = 111_320.0
+
+
+class StopsGridIndex:
+    """
+    Indice spaziale a griglia uniforme sulle fermate statiche.
+    Ogni cella (ix, iy) contiene gli indici delle fermate che vi ricadono; le coordinate
+    si leggono dagli array dello stops store. Una ricerca per raggio esamina così solo
+    le celle vicine invece di tutte le fermate.
+    """
+
+    def __init__(self, store, cell_size=GRID_CELL_SIZE_DEG):
+        self.store = store
+        self.cell_size = cell_size
+        self.cells = {}
+
+        for index, (lon, lat) in enumerate(zip(store.lon, store.lat)):
+            if math.isnan(lon) or math.isnan(lat):
+                continue  # Fermata senza coordinate valide (già segnalata dallo stops store)
+            self.cells.setdefault(self._cell_of(lon, lat), []).append(index)
+
+        # Estensione della griglia occupata: le ricerche per bbox non esaminano celle al di fuori.
+        cell_xs = [ix for ix, _ in self.cells]
+        cell_ys = [iy for _, iy in self.cells]
+        self.extent = (min(cell_xs, default=0), min(cell_ys, default=0),
+                       max(cell_xs, default=-1), max(cell_ys, default=-1))
+
+    def _cell_of(self, lon, lat):
+        return math.floor(lon / self.cell_size), math.floor(lat / self.cell_size)
+
+    def nearest(self, lat, lon, radius_m, limit):
+        """
+        Restituisce fino a 'limit' coppie (distanza_m, fermata) entro 'radius_m' metri,
+        ordinate dalla più vicina.
+        """
+        meters_per_deg_lon = METERS_PER_DEG_LAT * math.cos(math.radians(lat))
+        # Numero di celle da esaminare in ciascuna direzione per coprire il raggio richiesto.
+        span_x = math.ceil(radius_m / (meters_per_deg_lon * self.cell_size)) if meters_per_deg_lon > 0 else 0
+        span_y = math.ceil(radius_m / (METERS_PER_DEG_LAT * self.cell_size))
+        center_x, center_y = self._cell_of(lon, lat)
+
+        radius_sq = radius_m * radius_m
+        lons = self.store.lon
+        lats = self.store.lat
+        candidates = []
+        # Vicino ai poli span_x diverge: l'intervallo di celle viene limitato all'estensione occupata della griglia.
+        min_x, max_x = max(center_x - span_x, self.extent[0]), min(center_x + span_x, self.extent[2])
+        min_y, max_y = max(center_y - span_y, self.extent[1]), min(center_y + span_y, self.extent[3])
+        for ix in range(min_x, max_x + 1):
+            for iy in range(min_y, max_y + 1):
+                for index in self.cells.get((ix, iy), ()):
+                    # Approssimazione equirettangolare: più che sufficiente alla scala di una città.
+                    dx = (lons[index] - lon) * meters_per_deg_lon
+                    dy = (lats[index] - lat) * METERS_PER_DEG_LAT
+                    distance_sq = dx * dx + dy * dy
+                    if distance_sq <= radius_sq:
+                        candidates.append((distance_sq, index))
+
+        return [
+            (math.sqrt(distance_sq), self.store.stop(index))
+            for distance_sq, index in heapq.nsmallest(limit, candidates)
+        ]
+
+    def within_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """Restituisce gli indici (nell'ordine dello stops store) delle fermate dentro il rettangolo indicato."""
+        # Limitato alle coordinate valide: valori enormi (es. 1e308) farebbero traboccare il calcolo delle celle.
+        min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+        min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+        if min_lon > max_lon or min_lat > max_lat:
+            return []
+        min_x, min_y = self._cell_of(min_lon, min_lat)
+        max_x, max_y = self._cell_of(max_lon, max_lat)
+        min_x, min_y = max(min_x, self.extent[0]), max(min_y, self.extent[1])
+        max_x, max_y = min(max_x, self.extent[2]), min(max_y, self.extent[3])
+
+        lons = self.store.lon
+        lats = self.store.lat
+        indices = []
+        for ix in range(min_x, max_x + 1):
+            for iy in range(min_y, max_y + 1):
+                cell = self.cells.get((ix, iy))
+                if not cell:
+                    continue
+                if min_x < ix < max_x and min_y < iy < max_y:
+                    indices.extend(cell)  # Cella interna: tutte le sue fermate sono nel rettangolo
+                    continue
+                for index in cell:
+                    if min_lon <= lons[index] <= max_lon and min_lat <= lats[index] <= max_lat:
+                        indices.append(index)
+        indices.sort()
+        return indices
+
+
+@lru_cache(maxsize=None)
+def get_stops_spatial_index():
+    """Costruisce l'indice spaziale una sola volta per processo a partire dallo stops store."""
+    return StopsGridIndex(get_stops_store())
@@ -0,0 +1,109 @@
+import json
+import math
+import os
+from array import array
+from functools import lru_cache
+
+from api.response.encoding import StaticBody
+from api.response.streaming import serialize_items
+
+# Il percorso viene risolto rispetto a questo modulo e non alla directory di lavoro corrente.
+STOPS_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "onboard_stops.json")
+
+
+class StopsStore:
+    """
+    Rappresentazione colonnare delle fermate statiche.
+    Al posto di una lista di dizionari annidati si mantengono array paralleli: coordinate float64,
+    indici in una tabella di nomi e di tipi, e una mappa ID -> posizione per la ricerca in O(1).
+    Il dizionario JSON di una fermata viene costruito solo in uscita (vedi stop()).
+    """
+
+    def __init__(self, stops):
+        self.ids = []
+        self.id_index = {}
+        self.lon = array('d')
+        self.lat = array('d')
+        self.names = []  # tabella dei nomi distinti
+        self.name_refs = array('I')  # per ogni fermata, l'indice del nome in self.names
+        self.types = []  # tabella dei tipi distinti (surface, metro, ...)
+        self.type_refs = array('B')
+
+        name_ids = {}
+        type_ids = {}
+        for stop in stops:
+            stop_id = stop["info"]["id"]
+            details = stop.get("details") or {}
+            location = stop.get("location") or {}
+            try:
+                lon = float(location["X"])
+                lat = float(location["Y"])
+            except (KeyError, TypeError, ValueError):
+                print(f"Attenzione: fermata senza coordinate valide: {stop_id}")
+                lon = lat = math.nan
+
+            name = details.get("name")
+            name_id = name_ids.get(name)
+            if name_id is None:
+                name_id = name_ids[name] = len(self.names)
+                self.names.append(name)
+            stop_type = details.get("type")
+            type_id = type_ids.get(stop_type)
+            if type_id is None:
+                type_id = type_ids[stop_type] = len(self.types)
+                self.types.append(stop_type)
+
+            self.id_index[stop_id] = len(self.ids)
+            self.ids.append(stop_id)
+            self.lon.append(lon)
+            self.lat.append(lat)
+            self.name_refs.append(name_id)
+            self.type_refs.append(type_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        for index in range(len(self.ids)):
+            yield self.stop(index)
+
+    def name_of(self, index):
+        return self.names[self.name_refs[index]]
+
+    def stop(self, index):
+        """Costruisce il dizionario della fermata in posizione 'index', nel formato di onboard_stops.json."""
+        lon = self.lon[index]
+        lat = self.lat[index]
+        return {
+            "info": {"id": self.ids[index]},
+            "details": {"name": self.name_of(index), "type": self.types[self.type_refs[index]]},
+            # repr() di un float restituisce la stringa più corta che lo rappresenta: identica a quella del file.
+            "location": {
+                "X": repr(lon) if not math.isnan(lon) else None,
+                "Y": repr(lat) if not math.isnan(lat) else None,
+            },
+        }
+
+    def get(self, stop_id):
+        """Restituisce la fermata con l'ID indicato, oppure None."""
+        index = self.id_index.get(stop_id)
+        return self.stop(index) if index is not None else None
+
+
+@lru_cache(maxsize=None)
+def get_stops_store():
+    """
+    Legge onboard_stops.json una sola volta per processo e lo converte nella forma colonnare.
+    I dizionari letti dal file vengono scartati subito dopo la conversione.
+    """
+    with open(STOPS_FILE_PATH, 'r', encoding='utf-8') as f:
+        return StopsStore(json.load(f))
+
+
+@lru_cache(maxsize=None)
+def get_stops_static_body():
+    """
+    Restituisce l'elenco delle fermate come StaticBody: serializzazione e compressione
+    vengono calcolate una sola volta e riutilizzate per tutte le richieste successive a /stops.
+    """
+    return StaticBody(get_stops_store(), serializer=serialize_items)
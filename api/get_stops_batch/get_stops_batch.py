@@ -0,0 +1,59 @@
+import asyncio
+
+from api.constants import create_error_json
+from api.get_stop_details.get_stop_details import get_stop_details
+
+MAX_BATCH_SIZE = 20
+# Numero massimo di richieste linesummary in corso contemporaneamente per una singola richiesta batch.
+BATCH_CONCURRENCY = 8
+
+
+async def get_stops_batch(ids_param):
+    """
+    Recupera i dettagli di più fermate in un'unica richiesta, interrogando l'API upstream
+    in parallelo (al massimo BATCH_CONCURRENCY richieste alla volta).
+
+    Args:
+        ids_param (str): Gli ID delle fermate separati da virgola (es. "16634,11146").
+
+    Restituisce:
+        tuple: (data, content_type, status_code), dove data è un dizionario id -> risultato
+               di parse_stop, oppure id -> errore nel formato di create_error_json.
+    """
+    stop_ids = list(dict.fromkeys(i.strip() for i in (ids_param or "").split(",") if i.strip()))
+
+    if not stop_ids:
+        errore = create_error_json(400, "BAD_REQUEST", "Il parametro 'ids' è obbligatorio (ID separati da virgola).")
+        return errore, "application/json", 400
+
+    if len(stop_ids) > MAX_BATCH_SIZE:
+        errore = create_error_json(
+            400,
+            "BAD_REQUEST",
+            f"Troppe fermate richieste: il massimo è {MAX_BATCH_SIZE} per richiesta."
+        )
+        return errore, "application/json", 400
+
+    semaforo = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def dettagli_fermata(stop_id):
+        async with semaforo:
+            try:
+                data, content_type, status_code = await get_stop_details(stop_id)
+            except Exception as e:
+                # Un errore di parsing su una fermata non deve far fallire l'intera richiesta batch
+                print(f"Errore nel recupero della fermata {stop_id} nella richiesta batch: {e}")
+                return create_error_json(500, "INTERNAL_SERVER_ERROR", f"Impossibile elaborare la fermata {stop_id}.")
+
+        if status_code == 200:
+            return data
+        if isinstance(data, dict):
+            return create_error_json(
+                status_code,
+                data.get("error", "BAD_GATEWAY"),
+                data.get("details") or data.get("detail")
+            )
+        return create_error_json(status_code, "BAD_GATEWAY", str(data)[:500])
+
+    risultati = await asyncio.gather(*(dettagli_fermata(stop_id) for stop_id in stop_ids))
+    return dict(zip(stop_ids, risultati)), "application/json", 200
@@ -1,13 +1,275 @@
-import json
-import re  # Per la corrispondenza dei percorsi con espressioni regolari
+import asyncio
 from urllib.parse import unquote, parse_qs  # Per gestire percorsi e stringhe di query
 
 from api.get_line_details.get_line_details import get_line_details
 from api.get_lines.get_lines import get_lines
+from api.get_line_stops.get_line_stops import get_line_stops
 from api.get_stop_details.get_stop_details import get_stop_details
+from api.get_stop_live.get_stop_live import get_stop_live
+from api.get_stop_lines.get_stop_lines import get_stop_lines
+from api.get_stops_batch.get_stops_batch import get_stops_batch
 from api.get_stops.get_stops import get_stops
+from api.get_nearby_stops.get_nearby_stops import get_nearby_stops
+from api.search_stops.search_stops import search_stops
 from api.get_metro_status.get_metro_status import get_metro_status
-from api.constants import create_error_json
+from api.constants import UPSTREAM_DATA_AGE, create_error_json
+from api.parsing.fields import parse_fields
+from api.response.encoding import StaticBody, compress_stream, encode_body, negotiate_encoding, serialize_json
+from api.response.etag import compute_etag, etag_matches
+from api.response.sse import EventStreamBody
+from api.response.streaming import StreamingBody
+from api.routing.router import Router
+from api.snapshot.line_snapshot import get_line_snapshot
+
+# Cache-Control per tipo di risorsa: s-maxage vale per la cache edge di Vercel, max-age per i client.
+CACHE_CONTROL_STATIC = "public, max-age=86400, s-maxage=86400"  # Dati statici (fermate, info API)
+CACHE_CONTROL_LINES = "public, max-age=3600, s-maxage=21600"  # Elenco linee: cambia raramente
+CACHE_CONTROL_LINE_DETAILS = "public, max-age=300, s-maxage=600"  # Percorsi e geometria di una linea
+CACHE_CONTROL_REALTIME = "public, max-age=0, s-maxage=5"  # Tempi di attesa in tempo reale
+CACHE_CONTROL_METRO_STATUS = "public, max-age=30, s-maxage=30"
+CACHE_CONTROL_ERROR = "no-store"
+# Dato upstream servito oltre il suo TTL (header Age): le cache condivise non devono riutilizzarlo.
+CACHE_CONTROL_STALE = "public, max-age=0, s-maxage=0"
+CACHE_CONTROL_EVENT_STREAM = "no-cache"
+
+
+# Informazioni API in italiano, con campi chiave standard (servite su "/")
+ROOT_INFO = {
+    "titolo": "API Trasporto Pubblico",
+    "descrizione_generale": "Benvenuto nelle API per le informazioni sul trasporto pubblico.",
+    "parametri_globali": {
+        "fields": {
+            "tipo": "string",
+            "descrizione": "Per /lines, /lines/{lineId} e /stops/{stopId}: elenco separato da virgole dei sotto-campi da restituire (es. 'info,details.headCode,local.waitingTime' oppure 'info,lines.local.waitingTime')."
+        },
+        "pretty": {
+            "tipo": "boolean", "default": "false",
+            "descrizione": "Se 'true' (o '1'), il JSON della risposta viene indentato. Le risposte sono compresse (gzip/br) se il client lo consente tramite Accept-Encoding."
+        }
+    },
+    "endpoints": {
+        "StatoMetro": {
+            "Path": "/status/metro",
+            "Descrizione": "Restituisce lo stato attuale delle linee metropolitane."
+        },
+        "ElencoLinee": {
+            "Path": "/lines",
+            "Descrizione": "Restituisce un elenco di tutte le linee di trasporto disponibili.",
+            "ParametriDiQuery": {
+                "limit": {"tipo": "integer", "descrizione": "Numero di elementi per pagina (massimo 1000). Con 'limit' o 'cursor' la risposta diventa {\"items\": [...], \"nextCursor\": ...}."},
+                "cursor": {"tipo": "string", "descrizione": "Valore 'nextCursor' della pagina precedente."},
+                "stream": {"tipo": "string", "descrizione": "'1' per ricevere l'array JSON a blocchi, 'ndjson' per un oggetto JSON per riga (application/x-ndjson)."}
+            }
+        },
+        "DettagliLinea": {
+            "Path": "/lines/{lineId}",
+            "Descrizione": "Restituisce informazioni dettagliate per una specifica linea, inclusi i suoi percorsi e fermate.",
+            "ParametriDiQuery": {
+                "all": {
+                    "tipo": "boolean", "default": "false",
+                    "descrizione": "Se 'true', indica di recuperare anche i percorsi alternativi o le varianti della linea (corrisponde a alternativeRoutesMode nell'API upstream)."
+                },
+                "geometry": {
+                    "tipo": "string", "default": "full",
+                    "descrizione": "Formato della geometria: 'full' (punti originali), 'polyline' (Encoded Polyline di Google), 'delta' (interi [lon0, lat0, dlon1, dlat1, ...] moltiplicati per 10^5) oppure 'none'."
+                },
+                "simplify": {
+                    "tipo": "number",
+                    "descrizione": "Tolleranza in metri per semplificare la geometria (Douglas-Peucker)."
+                }
+            },
+            "Nota": "Se il server dispone dello snapshot delle linee (python -m api.snapshot.build_snapshot), il percorso principale viene servito senza interrogare l'API upstream."
+        },
+        "FermateLinea": {
+            "Path": "/lines/{lineId}/stops",
+            "Descrizione": "Restituisce le fermate della linea nell'ordine del percorso, senza interrogare l'API upstream (richiede lo snapshot delle linee, altrimenti 503)."
+        },
+        "ElencoFermate": {
+            "Path": "/stops",
+            "Descrizione": "Restituisce un elenco statico di tutte le fermate.",
+            "ParametriDiQuery": {
+                "bbox": {"tipo": "string", "descrizione": "Rettangolo 'minLon,minLat,maxLon,maxLat': restituisce solo le fermate al suo interno (es. la vista corrente di una mappa)."},
+                "limit": {"tipo": "integer", "descrizione": "Numero di elementi per pagina (massimo 1000). Con 'limit' o 'cursor' la risposta diventa {\"items\": [...], \"nextCursor\": ...}."},
+                "cursor": {"tipo": "string", "descrizione": "Valore 'nextCursor' della pagina precedente."},
+                "stream": {"tipo": "string", "descrizione": "'1' per ricevere l'array JSON a blocchi, 'ndjson' per un oggetto JSON per riga (application/x-ndjson)."}
+            }
+        },
+        "FermateVicine": {
+            "Path": "/stops/nearby",
+            "Descrizione": "Restituisce le fermate più vicine a un punto, ordinate per distanza (in metri, campo 'distance').",
+            "ParametriDiQuery": {
+                "lat": {"tipo": "number", "descrizione": "Latitudine del punto (obbligatoria)."},
+                "lon": {"tipo": "number", "descrizione": "Longitudine del punto (obbligatoria)."},
+                "radius": {"tipo": "number", "default": "500", "descrizione": "Raggio di ricerca in metri (massimo 5000)."},
+                "limit": {"tipo": "integer", "default": "10", "descrizione": "Numero massimo di fermate restituite (massimo 100)."}
+            }
+        },
+        "RicercaFermate": {
+            "Path": "/stops/search",
+            "Descrizione": "Cerca le fermate per nome, ignorando maiuscole, accenti e abbreviazioni (es. V.Le, P.Le), con corrispondenze approssimate.",
+            "ParametriDiQuery": {
+                "q": {"tipo": "string", "descrizione": "Testo da cercare (obbligatorio)."},
+                "limit": {"tipo": "integer", "default": "10", "descrizione": "Numero massimo di fermate restituite (massimo 50)."}
+            }
+        },
+        "DettagliFermateMultiple": {
+            "Path": "/stops/batch",
+            "Descrizione": "Restituisce i dettagli di più fermate in un'unica richiesta, come mappa ID -> dettagli (o errore per singola fermata).",
+            "ParametriDiQuery": {
+                "ids": {"tipo": "string", "descrizione": "ID delle fermate separati da virgola (obbligatorio, massimo 20)."}
+            }
+        },
+        "LineeFermata": {
+            "Path": "/stops/{stopId}/lines",
+            "Descrizione": "Restituisce la fermata con le linee (e direzioni) che la servono, senza tempi di attesa e senza interrogare l'API upstream (richiede lo snapshot delle linee, altrimenti 503)."
+        },
+        "TempiAttesaLive": {
+            "Path": "/stops/{stopId}/live",
+            "Descrizione": "Flusso server-sent events (text/event-stream) dei tempi di attesa della fermata: evento 'snapshot' con lo stato completo, poi 'update' con le sole linee il cui tempo di attesa è cambiato ({\"changed\": [...], \"removed\": [...]}) ed 'error' in caso di problemi upstream. L'API upstream viene interrogata una sola volta per fermata, qualunque sia il numero di client connessi."
+        },
+        "DettagliFermata": {
+            "Path": "/stops/{stopId}",
+            "Descrizione": "Restituisce informazioni dettagliate per una specifica fermata, potenzialmente includendo dati in tempo reale. Non supporta parametri aggiuntivi."
+            # "ParametriDiQuery" rimosso poiché 'short' è stato eliminato
+        }
+    }
+}
+ROOT_BODY = StaticBody(ROOT_INFO)  # Serializzato e compresso una sola volta
+
+# Mappa in memoria lo snapshot delle linee (se presente) all'avvio del processo, non alla prima richiesta.
+get_line_snapshot()
+
+
+def _param(query_params, name, default=None):
+    return query_params.get(name, [default])[0]
+
+
+# --- Tabella dei Percorsi ---
+# Ogni gestore riceve (parametri_percorso, parametri_query) e restituisce (data, content_type, status_code).
+router = Router()
+
+
+@router.route("/", cache_control=CACHE_CONTROL_STATIC)
+def _route_root(path_params, query_params):
+    return ROOT_BODY, "application/json", 200
+
+
+@router.route("/lines", cache_control=CACHE_CONTROL_LINES)
+async def _route_lines(path_params, query_params):
+    return await get_lines(
+        fields=parse_fields(_param(query_params, "fields")),
+        limit=_param(query_params, "limit"),
+        cursor=_param(query_params, "cursor"),
+        stream=_param(query_params, "stream"),
+    )
+
+
+@router.route("/lines/{line_id}", cache_control=CACHE_CONTROL_LINE_DETAILS)
+async def _route_line_details(path_params, query_params):
+    # Estrae il parametro 'all' e lo mappa a 'alternativeRoutesMode' per l'API upstream.
+    return await get_line_details(unquote(path_params["line_id"]), params={
+        "alternativeRoutesMode": _param(query_params, "all", "false").lower()
+    }, geometry=_param(query_params, "geometry", "full"), simplify=_param(query_params, "simplify"),
+        fields=parse_fields(_param(query_params, "fields")))
+
+
+@router.route("/lines/{line_id}/stops", cache_control=CACHE_CONTROL_LINES)
+def _route_line_stops(path_params, query_params):
+    return get_line_stops(unquote(path_params["line_id"]))
+
+
+@router.route("/stops", cache_control=CACHE_CONTROL_STATIC)
+def _route_stops(path_params, query_params):
+    return get_stops(
+        limit=_param(query_params, "limit"),
+        cursor=_param(query_params, "cursor"),
+        stream=_param(query_params, "stream"),
+        bbox=_param(query_params, "bbox"),
+    )
+
+
+@router.route("/stops/nearby", cache_control=CACHE_CONTROL_STATIC)
+def _route_nearby_stops(path_params, query_params):
+    return get_nearby_stops(
+        _param(query_params, "lat"),
+        _param(query_params, "lon"),
+        radius=_param(query_params, "radius"),
+        limit=_param(query_params, "limit"),
+    )
+
+
+@router.route("/stops/search", cache_control=CACHE_CONTROL_STATIC)
+def _route_search_stops(path_params, query_params):
+    return search_stops(_param(query_params, "q"), limit=_param(query_params, "limit"))
+
+
+@router.route("/stops/batch", cache_control=CACHE_CONTROL_REALTIME)
+async def _route_stops_batch(path_params, query_params):
+    return await get_stops_batch(_param(query_params, "ids"))
+
+
+@router.route("/stops/{stop_id}", cache_control=CACHE_CONTROL_REALTIME)
+async def _route_stop_details(path_params, query_params):
+    return await get_stop_details(unquote(path_params["stop_id"]), fields=parse_fields(_param(query_params, "fields")))
+
+
+@router.route("/stops/{stop_id}/lines", cache_control=CACHE_CONTROL_LINES)
+def _route_stop_lines(path_params, query_params):
+    return get_stop_lines(unquote(path_params["stop_id"]))
+
+
+@router.route("/stops/{stop_id}/live", cache_control=CACHE_CONTROL_EVENT_STREAM)
+def _route_stop_live(path_params, query_params):
+    return get_stop_live(unquote(path_params["stop_id"]))
+
+
+@router.route("/status/metro", cache_control=CACHE_CONTROL_METRO_STATUS)
+async def _route_metro_status(path_params, query_params):
+    return await get_metro_status()
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_event_stream(body, cache_control, receive, send):
+    """
+    Invia un flusso server-sent events finché il generatore produce eventi o finché il client non si disconnette.
+    Alla disconnessione il generatore viene chiuso, liberando l'iscrizione al poller condiviso.
+    """
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', body.content_type.encode('utf-8')),
+            (b'access-control-allow-origin', b'*'),
+            (b'cache-control', cache_control.encode('utf-8')),
+            (b'x-accel-buffering', b'no'),  # Disattiva il buffering dei reverse proxy (es. nginx)
+        ],
+    })
+
+    disconnessione = asyncio.ensure_future(_wait_for_disconnect(receive))
+    chunks = body.chunks()
+    try:
+        while True:
+            prossimo = asyncio.ensure_future(chunks.__anext__())
+            await asyncio.wait((prossimo, disconnessione), return_when=asyncio.FIRST_COMPLETED)
+            if not prossimo.done():  # Il client si è disconnesso
+                prossimo.cancel()
+                await asyncio.gather(prossimo, return_exceptions=True)
+                break
+            try:
+                chunk = prossimo.result()
+            except StopAsyncIteration:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        if not disconnessione.done():
+            await send({'type': 'http.response.body', 'body': b"", 'more_body': False})
+    finally:
+        disconnessione.cancel()
+        await chunks.aclose()
+        await body.aclose()
 
 
 async def app(scope, receive, send):
@@ -19,86 +281,26 @@ async def app(scope, receive, send):
 
     query_string = scope.get('query_string', b'')
     query_params = parse_qs(query_string.decode('utf-8'))
+    UPSTREAM_DATA_AGE.set(None)  # Impostata da make_request_async se viene servito un dato scaduto dalla cache
+    request_headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
 
-    # Impostazioni predefinite per la risposta (verranno sovrascritte se un percorso viene trovato)
-    status_code = 404
-    content_type = "application/json"  # Gli errori sono sempre JSON
-    data = create_error_json(
-        status_code,
-        "NOT_FOUND",
-        "La risorsa richiesta non è stata trovata"
-    )
+    # JSON compatto per impostazione predefinita; ?pretty=1 per l'output indentato
+    pretty = query_params.get("pretty", ["0"])[0].lower() in ("1", "true")
+    accepted_encoding = negotiate_encoding(request_headers.get('accept-encoding'))
 
     # --- Instradamento Richieste ---
-    if method == 'GET':
-        if path == '/':
-            status_code = 200
-            content_type = "application/json"
-            # Informazioni API in italiano, con campi chiave standard
-            data = {
-                "titolo": "API Trasporto Pubblico",
-                "descrizione_generale": "Benvenuto nelle API per le informazioni sul trasporto pubblico.",
-                "endpoints": {
-                    "StatoMetro": {
-                        "Path": "/status/metro",
-                        "Descrizione": "Restituisce lo stato attuale delle linee metropolitane."
-                    },
-                    "ElencoLinee": {
-                        "Path": "/lines",
-                        "Descrizione": "Restituisce un elenco di tutte le linee di trasporto disponibili."
-                    },
-                    "DettagliLinea": {
-                        "Path": "/lines/{lineId}",
-                        "Descrizione": "Restituisce informazioni dettagliate per una specifica linea, inclusi i suoi percorsi e fermate.",
-                        "ParametriDiQuery": {
-                            "all": {
-                                "tipo": "boolean", "default": "false",
-                                "descrizione": "Se 'true', indica di recuperare anche i percorsi alternativi o le varianti della linea (corrisponde a alternativeRoutesMode nell'API upstream)."
-                            }
-                        }
-                    },
-                    "ElencoFermate": {
-                        "Path": "/stops",
-                        "Descrizione": "Restituisce un elenco statico di tutte le fermate."
-                    },
-                    "DettagliFermata": {
-                        "Path": "/stops/{stopId}",
-                        "Descrizione": "Restituisce informazioni dettagliate per una specifica fermata, potenzialmente includendo dati in tempo reale. Non supporta parametri aggiuntivi."
-                        # "ParametriDiQuery" rimosso poiché 'short' è stato eliminato
-                    }
-                }
-            }
-
-        elif path == '/lines':
-            print(f"Routing per /lines")
-            data, content_type, status_code = get_lines()
-
-        elif match := re.fullmatch(r'/lines/([^/]+)', path):
-            line_id = unquote(match.group(1))
-            print(f"Routing per /lines/{line_id}, parametri: {query_params}")
-
-            # Estrae il parametro 'all' e lo mappa a 'alternativeRoutesMode' per l'API upstream.
-            data, content_type, status_code = get_line_details(line_id, params={
-                "alternativeRoutesMode": query_params.get("all", ["false"])[0].lower()
-            })
-
-        elif path == '/stops':
-            print(f"Routing per /stops")
-            data, content_type, status_code = get_stops()
-
-        elif match := re.fullmatch(r'/stops/([^/]+)', path):
-            stop_id = unquote(match.group(1))
-            print(f"Routing per /stops/{stop_id}")
-            # Passa i query_params direttamente. get_stop_details gestirà i parametri che conosce.
-            # Il parametro 'short' non è più documentato/supportato attivamente a questo livello.
-            data, content_type, status_code = get_stop_details(stop_id)
-        
-        elif path == '/status/metro':
-            print(f"Routing per /status/metro")
-            data, content_type, status_code = get_metro_status()
-        # Se nessun percorso GET specifico viene trovato, la risposta 404 predefinita rimane.
-
-    else:  # Gestisce metodi HTTP non GET
+    route, path_params = router.resolve(path)
+    cache_control = None  # Impostato dal percorso trovato; le risposte di errore non vanno mai in cache
+    extra_headers = []
+    if route is None:
+        status_code = 404
+        content_type = "application/json"  # Gli errori sono sempre JSON
+        data = create_error_json(
+            status_code,
+            "NOT_FOUND",
+            "La risorsa richiesta non è stata trovata"
+        )
+    elif method not in route.methods:
         status_code = 405
         content_type = "application/json"  # Gli errori sono sempre JSON
         data = create_error_json(
@@ -106,13 +308,61 @@ async def app(scope, receive, send):
             "METHOD_NOT_ALLOWED",
             "Questo metodo HTTP non è consentito per la risorsa richiesta"
         )
+        extra_headers.append((b'allow', ", ".join(sorted(route.methods)).encode('utf-8')))
+    else:
+        print(f"Routing per {path}, parametri: {query_params}" if query_params else f"Routing per {path}")
+        cache_control = route.cache_control
+        data, content_type, status_code = await route.call(path_params, query_params)
+
+    # --- Flusso di eventi server-sent events (/stops/{id}/live) ---
+    if isinstance(data, EventStreamBody) and status_code == 200:
+        await _send_event_stream(data, cache_control, receive, send)
+        return
+
+    # --- Risposta in streaming (?stream=...) ---
+    if isinstance(data, StreamingBody) and status_code == 200:
+        # Nessun content-length né ETag: il corpo viene serializzato e inviato un blocco alla volta.
+        response_headers = [
+            (b'content-type', content_type.encode('utf-8')),
+            (b'access-control-allow-origin', b'*'),
+            (b'vary', b'accept-encoding'),
+        ]
+        if accepted_encoding:
+            response_headers.append((b'content-encoding', accepted_encoding.encode('utf-8')))
+        data_age = UPSTREAM_DATA_AGE.get()
+        if data_age is not None:
+            cache_control = CACHE_CONTROL_STALE
+            response_headers.append((b'age', str(data_age).encode('utf-8')))
+        if cache_control:
+            response_headers.append((b'cache-control', cache_control.encode('utf-8')))
+
+        await send({
+            'type': 'http.response.start',
+            'status': status_code,
+            'headers': response_headers,
+        })
+        for chunk in compress_stream(data.chunks(pretty), accepted_encoding):
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b"", 'more_body': False})
+        return
 
     # --- Preparazione e Invio Risposta Finale ---
     response_body_bytes = b""
+    content_encoding = None
+
+    # Corpo statico compatto: serializzazione, varianti compresse ed ETag sono già in memoria (es. /stops)
+    static_encoded = isinstance(data, StaticBody) and not pretty
 
-    if content_type == 'application/json':
+    if static_encoded:
+        response_body_bytes, content_encoding = data.encoded(accepted_encoding)
+    elif isinstance(data, StaticBody):  # ?pretty=1: serializzato al momento, compresso come le risposte dinamiche
+        response_body_bytes = data.pretty_body()
+    elif isinstance(data, bytes):  # Se il gestore restituisce bytes già serializzati
+        response_body_bytes = data
+    elif content_type == 'application/json':
         try:
-            response_body_bytes = json.dumps(data, indent=2).encode('utf-8')
+            response_body_bytes = serialize_json(data, pretty)
         except TypeError as e:
             # Errore durante la serializzazione dei dati in JSON
             print(f"Errore di serializzazione JSON: {e}. Dati originali (troncati): {str(data)[:200]}...")
@@ -123,12 +373,10 @@ async def app(scope, receive, send):
                 "INTERNAL_SERVER_ERROR",
                 "Impossibile serializzare i dati della risposta in JSON."
             )
-            response_body_bytes = json.dumps(error_payload, indent=2).encode('utf-8')
+            response_body_bytes = serialize_json(error_payload, pretty)
             # content_type è già 'application/json' per gli errori
     elif isinstance(data, str):  # Se il gestore restituisce una stringa
         response_body_bytes = data.encode('utf-8')
-    elif isinstance(data, bytes):  # Se il gestore restituisce bytes direttamente
-        response_body_bytes = data
     else:
         # Tipo di dati imprevisto restituito dal gestore
         original_data_type_name = type(data).__name__
@@ -140,13 +388,51 @@ async def app(scope, receive, send):
             "INTERNAL_SERVER_ERROR",
             f"Formato dati imprevisto ricevuto dal gestore: {original_data_type_name}"
         )
-        response_body_bytes = json.dumps(error_payload, indent=2).encode('utf-8')
+        response_body_bytes = serialize_json(error_payload, pretty)
+
+    # Compressione negoziata con il client (i corpi statici compatti sono già stati compressi sopra)
+    uncompressed_body = response_body_bytes
+    if not static_encoded:
+        response_body_bytes, content_encoding = encode_body(response_body_bytes, accepted_encoding)
+
+    # ETag calcolato sui bytes non compressi, con il suffisso della codifica negoziata
+    etag = None
+    if status_code == 200:
+        if static_encoded:
+            etag = data.etag(content_encoding)
+        else:
+            etag = compute_etag(uncompressed_body, content_encoding=content_encoding)
+
+    data_age = UPSTREAM_DATA_AGE.get()
+    if status_code != 200:
+        cache_control = CACHE_CONTROL_ERROR
+    elif data_age is not None:
+        # L'età supera già l's-maxage del percorso: si impedisce il riuso da parte delle cache condivise.
+        cache_control = CACHE_CONTROL_STALE
 
     response_headers = [
         (b'content-type', content_type.encode('utf-8')),
         (b'content-length', str(len(response_body_bytes)).encode('utf-8')),
         (b'access-control-allow-origin', b'*'),  # Permetti l'utilizzo dei risultati da qualsiasi dominio frontend
+        (b'vary', b'accept-encoding'),
     ]
+    response_headers.extend(extra_headers)
+    if content_encoding:
+        response_headers.append((b'content-encoding', content_encoding.encode('utf-8')))
+    if etag:
+        response_headers.append((b'etag', etag.encode('utf-8')))
+    if cache_control:
+        response_headers.append((b'cache-control', cache_control.encode('utf-8')))
+    if data_age is not None and status_code == 200:
+        # Dato servito dalla cache oltre il suo TTL mentre viene aggiornato in background
+        response_headers.append((b'age', str(data_age).encode('utf-8')))
+
+    # Il client ha già questa rappresentazione: 304 senza corpo
+    if etag and etag_matches(request_headers.get('if-none-match'), etag):
+        status_code = 304
+        response_body_bytes = b""
+        response_headers = [(name, value) for name, value in response_headers
+                            if name not in (b'content-length', b'content-type', b'content-encoding')]
 
     await send({
         'type': 'http.response.start',
@@ -175,4 +461,13 @@ if __name__ == "__main__":
     print(f"  Dettagli Linea (base):   http://localhost:8000/lines/19|0")  # ID Linea d'esempio
     print(f"  Dettagli Linea (param):  http://localhost:8000/lines/19|0?all=true")
     print(f"  Tutte le Fermate:        http://localhost:8000/stops")
-    print(f"  Dettagli Fermata:        http://localhost:8000/stops/16634")  # ID Fermata d'esempio
\ No newline at end of file
+    print(f"  Fermate in un'area:      http://localhost:8000/stops?bbox=9.18,45.46,9.20,45.47")
+    print(f"  Fermate (paginate):      http://localhost:8000/stops?limit=100")
+    print(f"  Fermate (NDJSON):        http://localhost:8000/stops?stream=ndjson")
+    print(f"  Fermate Vicine:          http://localhost:8000/stops/nearby?lat=45.4642&lon=9.19&radius=500")
+    print(f"  Ricerca Fermate:         http://localhost:8000/stops/search?q=P.Le%20Lodi")
+    print(f"  Dettagli Fermata:        http://localhost:8000/stops/16634")  # ID Fermata d'esempio
+    print(f"  Linee di una Fermata:    http://localhost:8000/stops/16634/lines")
+    print(f"  Fermate di una Linea:    http://localhost:8000/lines/19|0/stops")
+    print(f"  Tempi di Attesa (SSE):   curl -N http://localhost:8000/stops/16634/live")
+    print(f"  Dettagli Più Fermate:    http://localhost:8000/stops/batch?ids=16634,11146")
\ No newline at end of file
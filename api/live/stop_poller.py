@@ -0,0 +1,155 @@
+import asyncio
+import os
+import weakref
+
+from api.constants import create_error_json
+from api.get_stop_details.get_stop_details import get_stop_details
+
+# Intervallo (in secondi) tra due interrogazioni della stessa fermata, indipendente dal numero di client connessi.
+LIVE_POLL_INTERVAL = float(os.environ.get("ONBOARD_LIVE_POLL_INTERVAL", "10"))
+# Intervallo massimo senza eventi prima di inviare un commento di keep-alive.
+LIVE_KEEPALIVE_INTERVAL = float(os.environ.get("ONBOARD_LIVE_KEEPALIVE_INTERVAL", "15"))
+# Numero massimo di fermate osservate contemporaneamente da questo processo.
+LIVE_MAX_WATCHED_STOPS = int(os.environ.get("ONBOARD_LIVE_MAX_WATCHED_STOPS", "500"))
+# Eventi in attesa per un singolo client: oltre questa soglia il client lento riceve di nuovo lo stato completo.
+SUBSCRIBER_QUEUE_SIZE = 16
+
+_WATCHES = weakref.WeakKeyDictionary()  # event loop -> {stop_id: StopWatch}
+
+
+def _line_key(line):
+    info = line.get("info") or {}
+    return f"{info.get('id')}:{info.get('direction')}"
+
+
+class StopWatch:
+    """
+    Poller condiviso di una fermata: un solo task interroga get_stop_details a intervalli regolari
+    e distribuisce a tutti gli iscritti soltanto le linee il cui local.waitingTime è cambiato.
+    Il task si ferma, e la fermata smette di essere osservata, quando l'ultimo iscritto si disconnette.
+    """
+
+    def __init__(self, stop_id, watches):
+        self.stop_id = stop_id
+        self._watches = watches
+        self.subscribers = set()
+        self.stop = None  # Ultima risposta di parse_stop, inviata per intero ai nuovi iscritti
+        self.waiting_times = {}  # chiave linea -> local.waitingTime dell'ultima interrogazione
+        self.error = None
+        self.task = None
+
+    def subscribe(self):
+        coda = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(coda)
+        if self.stop is not None:
+            coda.put_nowait(("snapshot", self.stop))
+        elif self.error is not None:
+            coda.put_nowait(("error", self.error))
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._run())
+        return coda
+
+    def unsubscribe(self, coda):
+        self.subscribers.discard(coda)
+        if not self.subscribers:
+            if self.task is not None:
+                self.task.cancel()
+            if self._watches.get(self.stop_id) is self:
+                del self._watches[self.stop_id]
+
+    def _publish(self, event, data):
+        for coda in self.subscribers:
+            try:
+                coda.put_nowait((event, data))
+            except asyncio.QueueFull:
+                # Client troppo lento: gli aggiornamenti persi vengono sostituiti dallo stato completo.
+                while not coda.empty():
+                    coda.get_nowait()
+                coda.put_nowait(("snapshot", self.stop) if self.stop is not None else (event, data))
+
+    def _apply(self, stop):
+        lines = stop.get("lines") or []
+        waiting_times = {_line_key(line): (line.get("local") or {}).get("waitingTime") for line in lines}
+
+        if self.stop is None:
+            self.stop = stop
+            self.waiting_times = waiting_times
+            self._publish("snapshot", stop)
+            return
+
+        changed = [line for line in lines
+                   if _line_key(line) not in self.waiting_times
+                   or self.waiting_times[_line_key(line)] != waiting_times[_line_key(line)]]
+        removed = [line.get("info") for line in self.stop.get("lines") or []
+                   if _line_key(line) not in waiting_times]
+        self.stop = stop
+        self.waiting_times = waiting_times
+        if changed or removed:
+            self._publish("update", {"changed": changed, "removed": removed})
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                # Le interrogazioni del poller non contano come richieste degli utenti per il pre-riscaldamento.
+                data, content_type, status_code = await get_stop_details(self.stop_id, prewarm=False)
+            except Exception as e:
+                print(f"Errore nell'aggiornamento live della fermata {self.stop_id}: {e}")
+                data, status_code = create_error_json(
+                    500, "INTERNAL_SERVER_ERROR", f"Impossibile elaborare la fermata {self.stop_id}."
+                ), 500
+
+            if status_code == 200:
+                self.error = None
+                self._apply(data)
+            elif data != self.error:
+                # Gli errori vengono notificati solo quando cambiano, senza interrompere il flusso.
+                self.error = data
+                self._publish("error", data)
+
+            await asyncio.sleep(LIVE_POLL_INTERVAL)
+
+
+class Subscription:
+    """
+    Iscrizione di un client al poller condiviso di una fermata, come iteratore asincrono di coppie (evento, dati):
+    "snapshot" con lo stato completo, "update" con le linee cambiate, "error" per gli errori upstream,
+    oppure None quando non ci sono eventi da LIVE_KEEPALIVE_INTERVAL secondi.
+    aclose() annulla l'iscrizione, anche se l'iteratore non è mai stato avviato.
+    """
+
+    def __init__(self, watch, coda):
+        self._watch = watch
+        self._coda = coda
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            return await asyncio.wait_for(self._coda.get(), LIVE_KEEPALIVE_INTERVAL)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            self._watch.unsubscribe(self._coda)
+
+
+def watch_stop(stop_id):
+    """
+    Iscrive il chiamante al poller condiviso della fermata e restituisce la Subscription,
+    oppure None se osservarla supererebbe LIVE_MAX_WATCHED_STOPS.
+    Controllo e inserimento avvengono senza punti di sospensione: richieste concorrenti per fermate
+    diverse non possono superare il limite.
+    """
+    watches = _WATCHES.setdefault(asyncio.get_running_loop(), {})
+    watch = watches.get(stop_id)
+    if watch is None:
+        if len(watches) >= LIVE_MAX_WATCHED_STOPS:
+            return None
+        watch = watches[stop_id] = StopWatch(stop_id, watches)
+    return Subscription(watch, watch.subscribe())
@@ -0,0 +1,59 @@
+def parse_fields(fields_param):
+    """
+    Converte il parametro 'fields' (es. "info,details.headCode,local.waitingTime") in un albero di selezione:
+    {"info": True, "details": {"headCode": True}, "local": {"waitingTime": True}}.
+    True indica l'intero sotto-albero. Restituisce None (nessuna proiezione) se il parametro è assente o vuoto.
+    """
+    if not fields_param:
+        return None
+
+    albero = {}
+    for percorso in fields_param.split(","):
+        parti = [p for p in percorso.strip().split(".") if p]
+        if not parti:
+            continue
+        nodo = albero
+        for parte in parti[:-1]:
+            figlio = nodo.get(parte)
+            if figlio is True:  # Il sotto-albero è già richiesto per intero
+                break
+            if figlio is None:
+                figlio = nodo[parte] = {}
+            nodo = figlio
+        else:
+            nodo[parti[-1]] = True
+    return albero or None
+
+
+def select_fields(fields, key):
+    """
+    Restituisce la selezione per il figlio 'key': None se non c'è proiezione (tutto),
+    True se il figlio è richiesto per intero, un dizionario se in parte, False se non richiesto.
+    """
+    if fields is None or fields is True:
+        return None
+    if fields is False:
+        return False
+    return fields.get(key, False)
+
+
+def wants_field(fields, *percorso):
+    """Indica se il campo al 'percorso' indicato (es. "details", "headCode") fa parte della selezione."""
+    for key in percorso:
+        fields = select_fields(fields, key)
+        if fields is False:
+            return False
+        if fields is None:
+            return True
+    return True
+
+
+def project_fields(data, fields):
+    """Restituisce una copia di 'data' ridotta ai soli campi selezionati (i dizionari annidati e le liste inclusi)."""
+    if fields is None or fields is True:
+        return data
+    if isinstance(data, list):
+        return [project_fields(item, fields) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: project_fields(value, fields[key]) for key, value in data.items() if key in fields}
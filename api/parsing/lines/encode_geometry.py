@@ -0,0 +1,131 @@
+import math
+
+GEOMETRY_MODES = ("full", "polyline", "delta", "none")
+# Cifre decimali mantenute nelle codifiche compatte (5 -> circa 1 m, come il polyline di Google).
+GEOMETRY_PRECISION = 5
+METERS_PER_DEG_LAT = 111_320.0
+
+
+def _point_coordinates(point):
+    """Restituisce (lon, lat) come float da un punto della geometria ATM, oppure None se non valido."""
+    try:
+        if isinstance(point, dict):
+            return float(point["X"]), float(point["Y"])
+        return float(point[0]), float(point[1])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+def simplify_points(coordinates, tolerance_m):
+    """
+    Semplificazione Douglas-Peucker (iterativa) di una lista di (lon, lat).
+    'tolerance_m' è la distanza massima in metri tra la linea semplificata e i punti scartati.
+    Restituisce gli indici dei punti da mantenere, in ordine.
+    """
+    count = len(coordinates)
+    if count < 3 or tolerance_m <= 0:
+        return list(range(count))
+
+    # Proiezione equirettangolare locale in metri: sufficiente alla scala di una linea urbana.
+    meters_per_deg_lon = METERS_PER_DEG_LAT * math.cos(math.radians(coordinates[0][1]))
+    xs = [lon * meters_per_deg_lon for lon, _ in coordinates]
+    ys = [lat * METERS_PER_DEG_LAT for _, lat in coordinates]
+
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance_m * tolerance_m
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay, bx, by = xs[first], ys[first], xs[last], ys[last]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        max_distance_sq, max_index = -1.0, first
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if length_sq == 0:
+                distance_sq = px * px + py * py
+            else:
+                cross = px * dy - py * dx
+                distance_sq = cross * cross / length_sq
+            if distance_sq > max_distance_sq:
+                max_distance_sq, max_index = distance_sq, i
+        if max_distance_sq > tolerance_sq:
+            keep[max_index] = True
+            stack.append((first, max_index))
+            stack.append((max_index, last))
+
+    return [i for i in range(count) if keep[i]]
+
+
+def _encode_signed(value, out):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode_polyline(coordinates, precision=GEOMETRY_PRECISION):
+    """Codifica una lista di (lon, lat) nel formato Encoded Polyline di Google (coppie lat, lon)."""
+    factor = 10 ** precision
+    out = []
+    previous_lat = previous_lon = 0
+    for lon, lat in coordinates:
+        lat_i, lon_i = round(lat * factor), round(lon * factor)
+        _encode_signed(lat_i - previous_lat, out)
+        _encode_signed(lon_i - previous_lon, out)
+        previous_lat, previous_lon = lat_i, lon_i
+    return "".join(out)
+
+
+def delta_encode(coordinates, precision=GEOMETRY_PRECISION):
+    """
+    Codifica una lista di (lon, lat) come array piatto di interi [lon0, lat0, dlon1, dlat1, ...],
+    dove i valori sono moltiplicati per 10^precision e ogni coppia dopo la prima è la differenza dalla precedente.
+    """
+    factor = 10 ** precision
+    scaled_lons = [round(lon * factor) for lon, _ in coordinates]
+    scaled_lats = [round(lat * factor) for _, lat in coordinates]
+    out = []
+    previous_lon = previous_lat = 0
+    for lon_i, lat_i in zip(scaled_lons, scaled_lats):
+        out.append(lon_i - previous_lon)
+        out.append(lat_i - previous_lat)
+        previous_lon, previous_lat = lon_i, lat_i
+    return out
+
+
+def encode_geometry(segments, mode="full", tolerance_m=None):
+    """
+    Trasforma la geometria prodotta da parse_line (lista di segmenti, ciascuno lista di punti)
+    nella modalità richiesta: "full" (punti originali), "polyline", "delta" oppure "none".
+    Con 'tolerance_m' ogni segmento viene prima semplificato con Douglas-Peucker.
+    """
+    if mode == "none":
+        return []
+    if mode == "full" and not tolerance_m:
+        return segments
+
+    encoded = []
+    for points in segments:
+        valid_points = []
+        coordinates = []
+        for point in points:
+            coordinate = _point_coordinates(point)
+            if coordinate is not None:
+                valid_points.append(point)
+                coordinates.append(coordinate)
+
+        if tolerance_m:
+            kept = simplify_points(coordinates, tolerance_m)
+            valid_points = [valid_points[i] for i in kept]
+            coordinates = [coordinates[i] for i in kept]
+
+        if mode == "polyline":
+            encoded.append(encode_polyline(coordinates))
+        elif mode == "delta":
+            encoded.append(delta_encode(coordinates))
+        else:
+            encoded.append(valid_points)
+    return encoded
@@ -1,23 +1,99 @@
 import re
+from functools import lru_cache
 
 from api.constants import create_local_waiting_time_json
+# Import del modulo (e non della funzione): parse_stop importa a sua volta questo modulo.
+from api.parsing.stops import parse_stop as parse_stop_module
+from api.parsing.fields import project_fields, select_fields, wants_field
 
 
 # import json # Rimosso perché non utilizzato
 # from operator import truediv # Rimosso perché non utilizzato
 
 
+# --- Espressioni regolari precompilate (una sola volta, all'import del modulo) ---
+_SOSTITUTIVO_RE = re.compile(r"(?:SOSTITUTIVO)?\s*(.*)", re.IGNORECASE)
+_NOTTURNA_RE = re.compile(r"(?:NOTTURNA)?\s*(.*)", re.IGNORECASE)
+_PREFISSO_NOTTURNO_RE = re.compile(r"(N\w*\s*-\s*)?\s*(.*)", re.IGNORECASE)
+_CON_DIR_RE = re.compile(r"^(.*?) con dir\. (.*?)$", re.IGNORECASE)
+
+_METRO_RE = re.compile(r"Linea (M\d+)\s*(.*)")
+_METRO_LEGGERA_RE = re.compile(r"Metro leggera")
+_TRAM_RE = re.compile(r"Tram (\d+)\s*(.*)")
+_BUS_XX_NXX_RE = re.compile(r"Bus\s+(\w*)\s*N\d*\s*- \s*(.*)", re.IGNORECASE)
+_NXX_RE = re.compile(r"N(\w*)\s*-\s*(.*)", re.IGNORECASE)
+_BUS_91_RE = re.compile(r"Bus\s+91\s*(.*)", re.IGNORECASE)
+_BUS_GENERALE_RE = re.compile(r"Bus (\w+)\s*(.*)")
+
+_COLORE_METRO_RE = re.compile(r"\s*\((Rossa|Verde|Gialla|Blu|Lilla)\)", re.IGNORECASE)
+_SUFFISSO_CIRCOLARE_RE = re.compile(r"\s*\(Circolare.*?\)$", re.IGNORECASE)
+_CIRCOLARE_RE = re.compile(r"circolare", re.IGNORECASE)
+_NOME_CIRCOLARE_RE = re.compile(r"\(?circolare.*?\)?", re.IGNORECASE)
+_MINUTI_ATTESA_RE = re.compile(r"(\d*) min", re.IGNORECASE)
+
+# Numero massimo di descrizioni (e nomi di località) memorizzate già analizzate.
+LINE_DESCRIPTION_CACHE_SIZE = 4096
+
+
+# --- Regole per il prefisso della descrizione: (espressione, funzione che restituisce (codice, percorso)) ---
+def _regola_metro(m, descrizione):
+    # Rimuove eventuali nomi di colore della linea (es. "(Rossa)")
+    return m.group(1), _COLORE_METRO_RE.sub("", m.group(2).strip()).strip()
+
+
+def _regola_metro_leggera(m, descrizione):
+    return "MeLa", descrizione[m.end():].strip()  # Codice specifico per Metro Leggera
+
+
+def _regola_tram(m, descrizione):
+    return m.group(1), m.group(2).strip()
+
+
+def _regola_notturna(m, descrizione):
+    # Linee con variante notturna (es. "Bus 90 N90 - ..." oppure "N26 - ...")
+    return f"{m.group(1).strip()}/N{m.group(1).strip()}", m.group(2).strip()
+
+
+def _regola_bus_91(m, descrizione):
+    return "91/N91", m.group(1).strip()
+
+
+def _regola_bus_generale(m, descrizione):
+    return m.group(1).strip(), m.group(2).strip()
+
+
+_REGOLE_BUS = (
+    (_BUS_XX_NXX_RE, _regola_notturna),
+    (_BUS_91_RE, _regola_bus_91),
+    (_BUS_GENERALE_RE, _regola_bus_generale),
+)
+_REGOLE_NOTTURNE = ((_NXX_RE, _regola_notturna),)
+
+# Tutte le espressioni sono ancorate all'inizio della descrizione: il primo carattere seleziona
+# le sole regole che possono corrispondere, nello stesso ordine di priorità.
+_REGOLE_PER_INIZIALE = {
+    "L": ((_METRO_RE, _regola_metro),),
+    "M": ((_METRO_LEGGERA_RE, _regola_metro_leggera),),
+    "T": ((_TRAM_RE, _regola_tram),),
+    "B": _REGOLE_BUS,
+    "b": _REGOLE_BUS,
+    "N": _REGOLE_NOTTURNE,
+    "n": _REGOLE_NOTTURNE,
+}
+
+
+@lru_cache(maxsize=LINE_DESCRIPTION_CACHE_SIZE)
 def _parse_location_name(name_str):
     """
     Parses a single location name string which might include 'con dir.' and 'e' alternatives.
     Returns a string with alternatives joined by '/'.
     """
     name_str = name_str.strip()
-    name_str = re.match(r"(?:SOSTITUTIVO)?\s*(.*)", name_str, re.IGNORECASE).group(1).strip()
-    name_str = re.match(r"(?:NOTTURNA)?\s*(.*)", name_str, re.IGNORECASE).group(1).strip()
-    name_str = re.match(r"(N\w*\s*-\s*)?\s*(.*)", name_str, re.IGNORECASE).group(2).strip()
+    name_str = _SOSTITUTIVO_RE.match(name_str).group(1).strip()
+    name_str = _NOTTURNA_RE.match(name_str).group(1).strip()
+    name_str = _PREFISSO_NOTTURNO_RE.match(name_str).group(2).strip()
 
-    con_dir_match = re.match(r"^(.*?) con dir\. (.*?)$", name_str, re.IGNORECASE)
+    con_dir_match = _CON_DIR_RE.match(name_str)
     if con_dir_match:
         main_part_str = con_dir_match.group(1).strip()
         branches_part_str = con_dir_match.group(2).strip()
@@ -54,50 +130,29 @@ def parse_line_description(descrizione, parsing_da_stazione=False):
     if not isinstance(descrizione, str):
         return None, None, None
 
+    # Il parametro viene ridotto a booleano prima della memoizzazione: parse_line passa il
+    # JourneyPatternId, che altrimenti renderebbe unica ogni chiave della cache.
+    return _parse_line_description(descrizione, parsing_da_stazione == False)
+
+
+@lru_cache(maxsize=LINE_DESCRIPTION_CACHE_SIZE)
+def _parse_line_description(descrizione, codice_da_prima_parola):
+    """
+    Implementazione memoizzata di parse_line_description (cache LRU condivisa dal processo).
+    'codice_da_prima_parola' indica se, in assenza di un prefisso riconosciuto, la prima
+    parola della descrizione va usata come codice della linea.
+    """
     codice_estratto = None  # Codice della linea estratto dalla descrizione (es. "M1", "19")
     parte_descrizione_percorso = descrizione  # Inizialmente, è l'intera descrizione;
     # verrà ridotta se si trova un prefisso di linea.
 
-    corrispondenza_metro = re.match(r"Linea (M\d+)\s*(.*)", descrizione)
-    corrispondenza_tram = re.match(r"Tram (\d+)\s*(.*)", descrizione)
-    corrispondenza_xx_Nxx = re.match(r"Bus\s+(\w*)\s*N\d*\s*- \s*(.*)", descrizione, re.IGNORECASE)
-    corrispondenza_Nxx = re.match(r"N(\w*)\s*-\s*(.*)", descrizione, re.IGNORECASE)
-    corrispondenza_91 = re.match(r"Bus\s+91\s*(.*)", descrizione, re.IGNORECASE)
-    corrispondenza_bus_generale = re.match(r"Bus (\w+)\s*(.*)", descrizione)
-    if corrispondenza_metro:
-        codice_estratto = corrispondenza_metro.group(1)  # Es. "M1"
-        parte_descrizione_percorso = corrispondenza_metro.group(2).strip()  # Il resto della descrizione
-        # Rimuove eventuali nomi di colore della linea (es. "(Rossa)")
-        parte_descrizione_percorso = re.sub(r"\s*\((Rossa|Verde|Gialla|Blu|Lilla)\)", "", parte_descrizione_percorso,
-                                            flags=re.IGNORECASE).strip()
-    elif descrizione.startswith("Metro leggera"):
-        codice_estratto = "MeLa"  # Codice specifico per Metro Leggera
-        parte_descrizione_percorso = descrizione.replace("Metro leggera", "", 1).strip()
-
-
-
-    elif corrispondenza_tram:
-        codice_estratto = corrispondenza_tram.group(1)  # Es. "19"
-        parte_descrizione_percorso = corrispondenza_tram.group(2).strip()  # Il resto
+    for espressione, regola in _REGOLE_PER_INIZIALE.get(descrizione[:1], ()):
+        corrispondenza = espressione.match(descrizione)
+        if corrispondenza:
+            codice_estratto, parte_descrizione_percorso = regola(corrispondenza, descrizione)
+            break
 
-
-
-
-    elif corrispondenza_xx_Nxx:
-        codice_estratto = f"{corrispondenza_xx_Nxx.group(1).strip()}/N{corrispondenza_xx_Nxx.group(1).strip()}"
-        parte_descrizione_percorso = corrispondenza_xx_Nxx.group(2).strip()
-    elif corrispondenza_Nxx:
-        codice_estratto = f"{corrispondenza_Nxx.group(1).strip()}/N{corrispondenza_Nxx.group(1).strip()}"
-
-        parte_descrizione_percorso = corrispondenza_Nxx.group(2).strip()
-    elif corrispondenza_91:
-        codice_estratto = "91/N91"
-        parte_descrizione_percorso = corrispondenza_91.group(1).strip()
-    elif corrispondenza_bus_generale:
-        codice_estratto = corrispondenza_bus_generale.group(1).strip()
-        parte_descrizione_percorso = corrispondenza_bus_generale.group(2).strip()
-
-    elif codice_estratto is None and parsing_da_stazione == False:
+    if codice_estratto is None and codice_da_prima_parola:
         if descrizione:  # Assicura che la descrizione originale non sia None o vuota
             parti_descrizione = descrizione.split(" ", 1)
             codice_estratto = parti_descrizione[0]  # Prende la prima parola come codice
@@ -133,16 +188,14 @@ def parse_line_description(descrizione, parsing_da_stazione=False):
             inizio_parsato = _parse_location_name(stringa_candidato_inizio)
             fine_parsata = _parse_location_name(stringa_candidato_fine)
             # Rimuove eventuali suffissi "(Circolare...)" dal punto di fine
-            candidato_fine_pulito = re.sub(r"\s*\(Circolare.*?\)$", "", fine_parsata if fine_parsata else "",
-                                           flags=re.IGNORECASE).strip()
+            candidato_fine_pulito = _SUFFISSO_CIRCOLARE_RE.sub("", fine_parsata if fine_parsata else "").strip()
             tutti_inizi.append(inizio_parsato)
             tutte_fini.append(candidato_fine_pulito)
         elif len(parti) == 1 and len(
                 segmenti_principali) == 1:  # Unica parte, potrebbe essere circolare o un singolo punto
             descrizione_singola = parti[0].strip()
-            if re.search(r"circolare", descrizione_singola, re.IGNORECASE):  # Se è una circolare
-                nome_circolare_pulito = re.sub(r"\(?circolare.*?\)?", "", descrizione_singola,
-                                               flags=re.IGNORECASE).strip()
+            if _CIRCOLARE_RE.search(descrizione_singola):  # Se è una circolare
+                nome_circolare_pulito = _NOME_CIRCOLARE_RE.sub("", descrizione_singola).strip()
                 # Caso speciale per descrizioni come "Nome (Circolare unica)"
                 if not nome_circolare_pulito and "unica" in descrizione_singola.lower():
                     nome_circolare_pulito = descrizione_singola  # Usa la descrizione originale
@@ -150,7 +203,7 @@ def parse_line_description(descrizione, parsing_da_stazione=False):
                 tutti_inizi.append(nome_circolare_parsato)
                 tutte_fini.append(nome_circolare_parsato)  # Inizio e fine sono uguali per circolari
             break  # Esce dal loop dopo aver processato il singolo segmento (circolare o meno)
-        elif len(parti) > 2 and re.search(r"circolare", frammento_segmento, re.IGNORECASE):  # Circolare complessa
+        elif len(parti) > 2 and _CIRCOLARE_RE.search(frammento_segmento):  # Circolare complessa
             # Esempio: "A - B - C (Circolare)"
             # Se le ultime due parti sono uguali (es. "X - Y - Y (Circolare)"), usa l'ultima come punto unico.
             if parti[-2].strip() == parti[-1].strip():
@@ -167,8 +220,7 @@ def parse_line_description(descrizione, parsing_da_stazione=False):
             stringa_candidato_fine = parti[-1].strip()  # Prende l'ultima parte come fine
             inizio_parsato = _parse_location_name(stringa_candidato_inizio)
             fine_parsata = _parse_location_name(stringa_candidato_fine)
-            candidato_fine_pulito = re.sub(r"\s*\(Circolare.*?\)$", "", fine_parsata if fine_parsata else "",
-                                           flags=re.IGNORECASE).strip()
+            candidato_fine_pulito = _SUFFISSO_CIRCOLARE_RE.sub("", fine_parsata if fine_parsata else "").strip()
             tutti_inizi.append(inizio_parsato)
             tutte_fini.append(candidato_fine_pulito)
         elif len(parti) == 1 and len(
@@ -187,20 +239,33 @@ def parse_line_description(descrizione, parsing_da_stazione=False):
     return codice_estratto, punti_inizio, punti_fine
 
 
-def parse_line(line_data_item):
-    line_data_item["TrafficBulletins"] = ""
+def line_description_cache_info():
+    """Statistiche (hit, miss, dimensione) delle cache di parsing delle descrizioni di linea."""
+    descrizioni = _parse_line_description.cache_info()
+    localita = _parse_location_name.cache_info()
+    return {
+        "descriptions": {"hits": descrizioni.hits, "misses": descrizioni.misses, "size": descrizioni.currsize},
+        "locations": {"hits": localita.hits, "misses": localita.misses, "size": localita.currsize},
+    }
+
+
+def parse_line(line_data_item, include_stops=True, include_geometry=True, fields=None):
     """
     Parses a single line data item (which can be in one of a few formats)
-    into the desired output format.
+    into the desired output format. The input dictionary is never modified.
 
     Args:
         line_data_item (dict): A single dictionary item representing a line.
+        include_stops (bool): If False, "Stops" is not parsed and details.stops is left empty.
+        include_geometry (bool): If False, "Geometry" is not read and details.geometry is left empty.
+            Lists and summaries that never show stops or shapes should pass False for both.
+        fields (dict): Optional field selection from api.parsing.fields.parse_fields. Only the selected
+            sub-trees are returned, and the work needed for the others (description parsing, stops,
+            geometry, waiting time) is skipped.
 
     Returns:
         dict: The processed line data, or None if skipped (e.g., TRENORD).
     """
-    from api.parsing.stops.parse_stop import parse_stop  # Import locale
-
     if not isinstance(line_data_item, dict):
         # print(f"Warning: line_data_item is not a dict: {line_data_item}")
         return None
@@ -253,8 +318,10 @@ def parse_line(line_data_item):
         if str(line_data_item.get("JourneyPatternId")).strip().startswith("Q"):
             return None
 
-    # Esegue il parsing della descrizione solo se abbiamo una descrizione e un tipo di veicolo
-    if details_desc is not None:
+    # Esegue il parsing della descrizione solo se abbiamo una descrizione e se i suoi campi sono richiesti
+    if details_desc is not None and (wants_field(fields, "details", "headCode")
+                                     or wants_field(fields, "details", "startPoint")
+                                     or wants_field(fields, "details", "endPoint")):
         extracted_code_from_desc, start_points, end_points = parse_line_description(
             details_desc,
             line_data_item.get("JourneyPatternId")
@@ -274,13 +341,15 @@ def parse_line(line_data_item):
 
     # --- 4. Parsa le Fermate (Stops) - attese nella chiave "Stops" di primo livello ---
     details_stops = []
-    stops_raw_list = line_data_item.get("Stops")  # Ottiene la lista di fermate, se presente
+    include_stops = include_stops and wants_field(fields, "details", "stops")
+    stops_fields = select_fields(select_fields(fields, "details"), "stops")
+    stops_raw_list = line_data_item.get("Stops") if include_stops else None  # Lista di fermate, se presente e richiesta
     if isinstance(stops_raw_list, list):
         for stop_data_item in stops_raw_list:
 
             if isinstance(stop_data_item, dict):  # Assicura che l'elemento sia un dizionario
                 try:
-                    parsed_stop = parse_stop(stop_data_item)
+                    parsed_stop = parse_stop_module.parse_stop(stop_data_item, fields=stops_fields)
                     if parsed_stop:  # parse_stop potrebbe restituire None
                         details_stops.append(parsed_stop)
                 except Exception as e:
@@ -290,7 +359,8 @@ def parse_line(line_data_item):
 
     # --- 5. Parsa la Geometria (Geometry) - attesa nella chiave "Geometry" di primo livello ---
     details_geometry = []
-    geometry_data_dict = line_data_item.get("Geometry")
+    include_geometry = include_geometry and wants_field(fields, "details", "geometry")
+    geometry_data_dict = line_data_item.get("Geometry") if include_geometry else None
     if isinstance(geometry_data_dict, dict):
         segments_list = geometry_data_dict.get("Segments")
         if isinstance(segments_list, list) and segments_list:  # Controlla se è una lista e non è vuota
@@ -312,8 +382,10 @@ def parse_line(line_data_item):
         details_vehicle = "surface"
 
     # --- 6. Parsa il tempo di attesa ---
-    raw_waiting_time = line_data_item.get("WaitMessage")
-    local_waiting_time = _parse_waiting_time(raw_waiting_time)
+    local_waiting_time = None
+    if wants_field(fields, "local", "waitingTime"):
+        raw_waiting_time = line_data_item.get("WaitMessage")
+        local_waiting_time = _parse_waiting_time(raw_waiting_time)
 
 
 
@@ -343,6 +415,8 @@ def parse_line(line_data_item):
         }
 
     }
+    if fields is not None:
+        processed_item = project_fields(processed_item, fields)
     return processed_item
 
 
@@ -377,7 +451,7 @@ def _parse_waiting_time(waitingtime):
 
 
     if isinstance(waitingtime, str):
-        val = re.match(r"(\d*) min", waitingtime, re.IGNORECASE)
+        val = _MINUTI_ATTESA_RE.match(waitingtime)
         if val:
             local_waiting_time = create_local_waiting_time_json("time", val.group(1))
 
@@ -1,11 +1,47 @@
 from bs4 import BeautifulSoup
 import re
 
+try:
+    import lxml  # noqa: F401  Opzionale: tree builder più veloce di html.parser
+    TREE_BUILDER = 'lxml'
+except ImportError:
+    TREE_BUILDER = 'html.parser'
+
+# Il box dello stato linee occupa pochi KB di una home page molto più grande: si analizza solo quello.
+_ANCORA_STATUS_RE = re.compile(r'id=["\']StatusLinee["\']')
+_CLASSE_STATUS_RE = re.compile(r'class=["\'][^"\']*StatusLinee')
+# Caratteri conservati dopo l'ultimo elemento StatusLinee*, per includerne il testo e i tag di chiusura.
+MARGINE_FRAMMENTO = 4096
+
+
+def _estrai_frammento_status(html_content):
+    """
+    Restituisce la porzione di HTML che va dal primo all'ultimo elemento "StatusLinee*"
+    (tabella delle linee e messaggio), oppure None se la pagina non contiene il box.
+    """
+    ancora = _ANCORA_STATUS_RE.search(html_content)
+    if not ancora:
+        return None
+
+    inizio = ancora.start()
+    fine = ancora.end()
+    for corrispondenza in _CLASSE_STATUS_RE.finditer(html_content):
+        inizio = min(inizio, corrispondenza.start())
+        fine = max(fine, corrispondenza.end())
+
+    # Si parte dall'apertura del tag e ci si ferma all'inizio di un tag, per non troncarne uno a metà.
+    inizio = max(html_content.rfind('<', 0, inizio), 0)
+    fine = html_content.find('<', fine + MARGINE_FRAMMENTO)
+    return html_content[inizio:fine if fine != -1 else len(html_content)]
+
+
 def parse_metro_status(html_content):
     """
     Parses the HTML content of the ATM status page to extract metro line statuses.
-    """ 
-    soup = BeautifulSoup(html_content, 'html.parser')
+    Only the StatusLinee fragment is parsed; the whole page is used as a fallback if it cannot be found.
+    """
+    frammento = _estrai_frammento_status(html_content)
+    soup = BeautifulSoup(frammento if frammento is not None else html_content, TREE_BUILDER)
 
     rows = soup.select('#StatusLinee tr')
 
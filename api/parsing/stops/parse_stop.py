@@ -1,7 +1,14 @@
-def parse_stop(data):
-    """Transforms the given data into the desired format."""
+# Import del modulo (e non della funzione): parse_line importa a sua volta questo modulo.
+from api.parsing.lines import parse_line as parse_line_module
+from api.parsing.fields import project_fields, select_fields
 
-    from api.parsing.lines.parse_line import parse_line
+
+def parse_stop(data, fields=None):
+    """
+    Transforms the given data into the desired format. The input dictionary is never modified.
+    'fields' (from api.parsing.fields.parse_fields) optionally restricts the output; the lines
+    are not parsed at all unless "lines" is part of the selection.
+    """
 
     stop_point = data
 
@@ -31,13 +38,19 @@ def parse_stop(data):
         transformed_data["details"]["type"] = "metro"
 
     parsed_lines = []
+    lines_fields = select_fields(fields, "lines")
+    if lines_fields is False:
+        lines = []
 
     for line_data in lines:
-        line = line_data
-        transformed_line = parse_line(line)
-
-        parsed_lines.append(transformed_line)
+        # Le linee di una fermata non riportano fermate né geometria: si usa la variante leggera
+        transformed_line = parse_line_module.parse_line(line_data, include_stops=False, include_geometry=False,
+                                                        fields=lines_fields)
+        if transformed_line:
+            parsed_lines.append(transformed_line)
 
-    transformed_data["lines"] = list(filter(None, parsed_lines))
+    transformed_data["lines"] = parsed_lines
 
+    if fields is not None:
+        transformed_data = project_fields(transformed_data, fields)
     return transformed_data
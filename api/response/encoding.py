@@ -0,0 +1,137 @@
+import gzip
+import json
+import zlib
+
+from api.response.etag import compute_etag
+
+try:
+    import brotli  # Opzionale: senza il pacchetto 'brotli' si usa solo gzip
+except ImportError:
+    brotli = None
+
+# Sotto questa dimensione la compressione non porta benefici apprezzabili.
+MIN_COMPRESS_SIZE = 1024
+# Livelli usati per le risposte dinamiche (compresse a ogni richiesta) e per quelle statiche (compresse una volta).
+DYNAMIC_GZIP_LEVEL = 5
+DYNAMIC_BROTLI_QUALITY = 4
+# Le varianti statiche vengono calcolate alla prima richiesta, sull'event loop: livelli moderati, perché
+# la qualità massima (brotli 11 su ~720 KB di /stops) bloccherebbe per secondi ogni istanza appena avviata.
+STATIC_GZIP_LEVEL = 6
+STATIC_BROTLI_QUALITY = 5
+
+
+def serialize_json(data, pretty=False):
+    """Serializza in JSON compatto (predefinito) oppure indentato se 'pretty' è vero."""
+    if pretty:
+        return json.dumps(data, indent=2).encode('utf-8')
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Sceglie la codifica di compressione in base all'header Accept-Encoding del client.
+    Restituisce "br", "gzip" oppure None (nessuna compressione).
+    """
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    def quality_of(encoding):
+        return accepted.get(encoding, accepted.get('*', 0.0))
+
+    if brotli is not None and quality_of('br') > 0 and quality_of('br') >= quality_of('gzip'):
+        return "br"
+    if quality_of('gzip') > 0:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding, static=False):
+    """Comprime 'body' con la codifica indicata; i livelli più alti sono riservati ai contenuti statici."""
+    if encoding == "br":
+        return brotli.compress(body, quality=STATIC_BROTLI_QUALITY if static else DYNAMIC_BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=STATIC_GZIP_LEVEL if static else DYNAMIC_GZIP_LEVEL, mtime=0)
+    return body
+
+
+def encode_body(body, encoding):
+    """
+    Applica la compressione negoziata a un corpo di risposta dinamico.
+    Restituisce (bytes, content_encoding), con content_encoding None se il corpo resta invariato.
+    """
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    return compress(body, encoding), encoding
+
+
+def compress_stream(chunks, encoding):
+    """
+    Comprime una sequenza di blocchi in streaming. Ogni blocco viene svuotato dal compressore
+    (sync flush) in modo che il client possa decodificarlo senza attendere la fine della risposta.
+    """
+    if encoding == "br":
+        compressore = brotli.Compressor(quality=DYNAMIC_BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressore.process(chunk) + compressore.flush()
+        yield compressore.finish()
+    elif encoding == "gzip":
+        compressore = zlib.compressobj(DYNAMIC_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # Formato gzip
+        for chunk in chunks:
+            yield compressore.compress(chunk) + compressore.flush(zlib.Z_SYNC_FLUSH)
+        yield compressore.flush()
+    else:
+        yield from chunks
+
+
+class StaticBody:
+    """
+    Corpo di risposta per dati che non cambiano durante la vita del processo (es. l'elenco delle fermate).
+    La serializzazione compatta e le varianti compresse vengono calcolate alla prima richiesta
+    e poi riutilizzate dalla memoria.
+    'serializer' consente di serializzare dati che non sono oggetti JSON nativi (es. lo stops store colonnare).
+    """
+
+    def __init__(self, data, serializer=serialize_json):
+        self.data = data
+        self.serializer = serializer
+        self._body = None
+        self._etags = {}
+        self._encoded = {}
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = self.serializer(self.data)
+        return self._body
+
+    def etag(self, content_encoding=None):
+        """ETag del corpo compatto per la codifica indicata, calcolato sui bytes non compressi una sola volta."""
+        etag = self._etags.get(content_encoding)
+        if etag is None:
+            etag = self._etags[content_encoding] = compute_etag(self.body, content_encoding=content_encoding)
+        return etag
+
+    def pretty_body(self):
+        # Opt-in esplicito del client (?pretty=1): non viene memorizzato.
+        return self.serializer(self.data, pretty=True)
+
+    def encoded(self, encoding):
+        """Come encode_body, ma la variante compressa viene calcolata una sola volta per codifica."""
+        if encoding is None or len(self.body) < MIN_COMPRESS_SIZE:
+            return self.body, None
+        compressed = self._encoded.get(encoding)
+        if compressed is None:
+            compressed = self._encoded[encoding] = compress(self.body, encoding, static=True)
+        return compressed, encoding
@@ -0,0 +1,36 @@
+import hashlib
+
+
+def compute_etag(body, content_encoding=None):
+    """
+    Calcola un ETag forte dai bytes non compressi della risposta.
+    Ogni codifica (gzip, br) è una rappresentazione diversa e riceve un suffisso proprio.
+    """
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    if content_encoding:
+        return f'"{digest}-{content_encoding}"'
+    return f'"{digest}"'
+
+
+def _strip_encoding(etag):
+    # '"digest-gzip"' -> '"digest"'
+    return etag.split('-', 1)[0].rstrip('"') + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Verifica l'header If-None-Match contro l'ETag della risposta (confronto debole, come da RFC 9110).
+    Un client che ha in cache un'altra codifica della stessa rappresentazione viene comunque considerato aggiornato.
+    """
+    if not if_none_match:
+        return False
+    base = _strip_encoding(etag)
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag or _strip_encoding(candidate) == base:
+            return True
+    return False
@@ -0,0 +1,32 @@
+from itertools import islice
+
+MAX_PAGE_SIZE = 1000
+
+
+def parse_page_params(limit, cursor):
+    """
+    Valida i parametri di paginazione 'limit' e 'cursor' ricevuti come stringhe dalla query string.
+    Il cursore è la posizione (offset) del primo elemento della pagina, come restituita in 'nextCursor'.
+
+    Restituisce:
+        tuple: (limit, offset), con limit limitato a MAX_PAGE_SIZE.
+
+    Solleva:
+        ValueError: se i parametri non sono interi validi.
+    """
+    limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+    offset = int(cursor) if cursor else 0
+    if limit <= 0 or offset < 0:
+        raise ValueError("limit/cursor fuori intervallo")
+    return min(limit, MAX_PAGE_SIZE), offset
+
+
+def paginate(items, limit, offset):
+    """
+    Restituisce la pagina di 'items' (lista o iterabile) che inizia in 'offset'.
+    'nextCursor' è None quando non ci sono altri elementi.
+    """
+    # Si legge un elemento in più solo per sapere se esiste una pagina successiva.
+    pagina = list(islice(items, offset, offset + limit + 1))
+    next_cursor = str(offset + limit) if len(pagina) > limit else None
+    return {"items": pagina[:limit], "nextCursor": next_cursor}
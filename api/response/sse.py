@@ -0,0 +1,35 @@
+import json
+
+SSE_CONTENT_TYPE = "text/event-stream"
+
+
+def format_sse(event, data):
+    """Formatta un evento server-sent events: 'data' viene serializzato in JSON compatto su una sola riga."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode('utf-8')
+
+
+class EventStreamBody:
+    """
+    Corpo di risposta server-sent events alimentato da un iteratore asincrono di coppie (evento, dati).
+    Un elemento None produce un commento di keep-alive, che tiene aperta la connessione attraverso i proxy.
+    La risposta termina quando l'iteratore si esaurisce o quando il client si disconnette (gestito dall'app).
+    """
+
+    content_type = SSE_CONTENT_TYPE
+
+    def __init__(self, events):
+        self.events = events
+
+    async def chunks(self):
+        async for item in self.events:
+            if item is None:
+                yield b": keep-alive\n\n"
+            else:
+                event, data = item
+                yield format_sse(event, data)
+
+    async def aclose(self):
+        """Chiude l'iteratore degli eventi (es. per annullare l'iscrizione al poller condiviso)."""
+        aclose = getattr(self.events, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,82 @@
+import json
+
+# Dimensione indicativa di ciascun blocco inviato al client con more_body=True.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+STREAM_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def parse_stream_param(stream):
+    """
+    Interpreta il parametro 'stream': None se lo streaming non è richiesto,
+    altrimenti il formato ("json" per un array JSON, "ndjson" per un oggetto per riga).
+    """
+    if stream is None:
+        return None
+    stream = stream.lower()
+    if stream in ("1", "true", "json"):
+        return "json"
+    if stream == "ndjson":
+        return "ndjson"
+    return None
+
+
+class StreamingBody:
+    """
+    Corpo di risposta prodotto a blocchi: gli elementi vengono serializzati man mano che vengono inviati,
+    senza mai costruire in memoria l'intero documento. 'items' può essere un generatore, così
+    anche la trasformazione dei dati avviene durante l'invio.
+    """
+
+    def __init__(self, items, format="json"):
+        self.items = items
+        self.format = format
+
+    @property
+    def content_type(self):
+        return STREAM_FORMATS[self.format]
+
+    def _serialize_item(self, item, pretty):
+        if pretty:
+            # Rientro aggiuntivo di un livello: il risultato coincide con json.dumps(lista, indent=2).
+            return ("  " + json.dumps(item, indent=2).replace("\n", "\n  ")).encode('utf-8')
+        return json.dumps(item, separators=(',', ':')).encode('utf-8')
+
+    def chunks(self, pretty=False):
+        """Genera blocchi di bytes di circa STREAM_CHUNK_SIZE che, concatenati, formano il documento completo."""
+        ndjson = self.format == "ndjson"
+        pretty = pretty and not ndjson  # In NDJSON ogni elemento deve stare su una sola riga
+        separatore = b"\n" if ndjson else (b",\n" if pretty else b",")
+
+        blocco = [] if ndjson else [b"[\n" if pretty else b"["]
+        dimensione = 0
+        primo = True
+        for item in self.items:
+            if not primo and not ndjson:
+                blocco.append(separatore)
+            primo = False
+            serializzato = self._serialize_item(item, pretty)
+            blocco.append(serializzato)
+            if ndjson:
+                blocco.append(separatore)
+            dimensione += len(serializzato) + 1
+            if dimensione >= STREAM_CHUNK_SIZE:
+                yield b"".join(blocco)
+                blocco = []
+                dimensione = 0
+
+        if not ndjson:
+            if primo:
+                blocco = [b"[]"]  # Come json.dumps per una lista vuota
+            else:
+                blocco.append(b"\n]" if pretty else b"]")
+        if blocco:
+            yield b"".join(blocco)
+
+
+def serialize_items(items, pretty=False):
+    """Serializza un iterabile di elementi come array JSON, con lo stesso risultato di serialize_json su una lista."""
+    return b"".join(StreamingBody(items).chunks(pretty))
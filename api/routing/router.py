@@ -0,0 +1,83 @@
+import inspect
+
+ALLOWED_METHODS = ("GET",)
+
+
+class Route:
+    """Un percorso registrato: schema (es. "/lines/{line_id}"), gestore e Cache-Control delle risposte riuscite."""
+
+    def __init__(self, pattern, handler, cache_control=None, methods=ALLOWED_METHODS):
+        self.pattern = pattern
+        self.handler = handler
+        self.cache_control = cache_control
+        self.methods = frozenset(methods)
+        self.segments = pattern[1:].split("/")
+        # Posizione e nome dei segmenti variabili ("{nome}")
+        self.params = [(i, s[1:-1]) for i, s in enumerate(self.segments) if s.startswith("{") and s.endswith("}")]
+        self.is_async = inspect.iscoroutinefunction(handler)
+
+    def match_segments(self, segments):
+        """Restituisce i parametri del percorso se i segmenti corrispondono allo schema, altrimenti None."""
+        path_params = {}
+        variable = dict(self.params)
+        for i, (expected, actual) in enumerate(zip(self.segments, segments)):
+            if i in variable:
+                if not actual:
+                    return None
+                path_params[variable[i]] = actual
+            elif expected != actual:
+                return None
+        return path_params
+
+    async def call(self, path_params, query_params):
+        if self.is_async:
+            return await self.handler(path_params, query_params)
+        return self.handler(path_params, query_params)
+
+
+class Router:
+    """
+    Tabella dei percorsi costruita una sola volta all'avvio.
+    I percorsi statici si risolvono con una ricerca in un dizionario; quelli con parametri sono
+    raggruppati per (primo segmento, numero di segmenti), così ogni richiesta confronta
+    al più i pochi schemi del proprio gruppo, a prescindere dal numero di endpoint registrati.
+    """
+
+    def __init__(self):
+        self.static_routes = {}
+        self.dynamic_routes = {}
+
+    def add(self, pattern, handler, cache_control=None, methods=ALLOWED_METHODS):
+        """
+        Registra un percorso. Il primo segmento deve essere fisso (es. "/stops/{stop_id}"): i percorsi con
+        parametri sono indicizzati per primo segmento, e uno schema come "/{lang}/stops" non verrebbe mai trovato.
+        """
+        route = Route(pattern, handler, cache_control, methods)
+        if route.params and route.params[0][0] == 0:
+            raise ValueError(f"Percorso non supportato {pattern!r}: il primo segmento non può essere un parametro")
+        if not route.params:
+            self.static_routes[pattern] = route
+        else:
+            key = (route.segments[0], len(route.segments))
+            self.dynamic_routes.setdefault(key, []).append(route)
+        return route
+
+    def route(self, pattern, cache_control=None, methods=ALLOWED_METHODS):
+        """Decoratore equivalente ad add()."""
+        def decorator(handler):
+            self.add(pattern, handler, cache_control, methods)
+            return handler
+        return decorator
+
+    def resolve(self, path):
+        """Restituisce (route, parametri_percorso) per il percorso indicato, oppure (None, None)."""
+        route = self.static_routes.get(path)
+        if route is not None:
+            return route, {}
+
+        segments = path[1:].split("/")
+        for route in self.dynamic_routes.get((segments[0], len(segments)), ()):
+            path_params = route.match_segments(segments)
+            if path_params is not None:
+                return route, path_params
+        return None, None
@@ -0,0 +1,31 @@
+from api.constants import create_error_json
+from api.get_stops.search_index import get_stops_search_index
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def search_stops(query, limit=None):
+    """
+    Cerca le fermate per nome (per prefisso e, in mancanza di risultati sufficienti, per similarità).
+    La ricerca ignora maiuscole, accenti e abbreviazioni come V.Le o P.Le.
+
+    Restituisce:
+        tuple: (data, content_type, status_code)
+    """
+    if not query or not query.strip():
+        errore = create_error_json(400, "BAD_REQUEST", "Il parametro 'q' è obbligatorio.")
+        return errore, "application/json", 400
+
+    try:
+        limit = int(limit) if limit is not None else DEFAULT_LIMIT
+    except ValueError:
+        errore = create_error_json(400, "BAD_REQUEST", "Il parametro 'limit' deve essere un numero intero.")
+        return errore, "application/json", 400
+
+    if limit <= 0:
+        errore = create_error_json(400, "BAD_REQUEST", "Il parametro 'limit' deve essere positivo.")
+        return errore, "application/json", 400
+
+    risultati = get_stops_search_index().search(query, min(limit, MAX_LIMIT))
+    return risultati, "application/json", 200
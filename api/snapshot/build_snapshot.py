@@ -0,0 +1,83 @@
+"""
+Genera lo snapshot offline delle linee (percorsi, fermate e geometria) usato da /lines/{lineId}.
+
+Uso:
+    python -m api.snapshot.build_snapshot [--output PERCORSO] [--concurrency N]
+
+Per ogni journey pattern restituito dall'API upstream si scaricano i dettagli, si elaborano con
+parse_line e si scrive il file indicizzato letto (tramite mmap) dal server all'avvio.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from api.constants import GIROMILANO_HEADERS, make_request_async
+from api.get_lines.get_lines import API_URL
+from api.parsing.lines.parse_line import parse_line
+from api.snapshot.line_snapshot import SNAPSHOT_PATH, write_snapshot
+
+DEFAULT_CONCURRENCY = 4
+
+
+async def fetch_lines(concurrency=DEFAULT_CONCURRENCY):
+    """
+    Scarica ed elabora tutti i journey pattern.
+
+    Restituisce:
+        tuple: (linee, errori), dove linee è un dizionario JourneyPatternId -> output di parse_line
+               ed errori un dizionario JourneyPatternId -> status_code delle richieste fallite.
+    """
+    data, content_type, status_code = await make_request_async(API_URL, headers=GIROMILANO_HEADERS)
+    if status_code != 200 or not isinstance(data, dict) or not isinstance(data.get("JourneyPatterns"), list):
+        raise RuntimeError(f"Impossibile recuperare l'elenco dei journey pattern (stato {status_code}): {data}")
+
+    line_ids = list(dict.fromkeys(
+        str(item["JourneyPatternId"]) for item in data["JourneyPatterns"]
+        if isinstance(item, dict) and item.get("JourneyPatternId")
+    ))
+    print(f"{len(line_ids)} journey pattern da elaborare")
+
+    semaforo = asyncio.Semaphore(concurrency)
+    linee = {}
+    errori = {}
+
+    async def elabora(line_id):
+        async with semaforo:
+            dettagli, _, stato = await make_request_async(f"{API_URL}{line_id}", headers=GIROMILANO_HEADERS,
+                                                          params={"alternativeRoutesMode": "false"})
+        if stato != 200:
+            errori[line_id] = stato
+            return
+        elaborata = parse_line(dettagli)
+        if elaborata:  # parse_line scarta ad esempio le linee TRENORD
+            linee[line_id] = elaborata
+
+    await asyncio.gather(*(elabora(line_id) for line_id in line_ids))
+    # Ordine stabile nel file, indipendente dall'ordine di completamento delle richieste.
+    return {line_id: linee[line_id] for line_id in line_ids if line_id in linee}, errori
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera lo snapshot offline delle linee ATM.")
+    parser.add_argument("--output", default=SNAPSHOT_PATH, help=f"File di destinazione (predefinito: {SNAPSHOT_PATH})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Richieste upstream contemporanee (predefinito: %(default)s)")
+    args = parser.parse_args(argv)
+
+    inizio = time.monotonic()
+    linee, errori = asyncio.run(fetch_lines(max(1, args.concurrency)))
+    if not linee:
+        raise SystemExit("Nessuna linea elaborata: lo snapshot non viene scritto.")
+
+    write_snapshot(args.output, linee, metadata={
+        "builtAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "lines": len(linee),
+    })
+    print(f"Snapshot scritto in {args.output}: {len(linee)} linee in {time.monotonic() - inizio:.1f}s")
+    if errori:
+        print(f"Attenzione: {len(errori)} journey pattern non recuperati: {errori}")
+
+
+if __name__ == "__main__":
+    main()
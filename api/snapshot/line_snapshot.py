@@ -0,0 +1,146 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from functools import lru_cache
+
+# Formato del file: MAGIC, lunghezza dell'indice (uint32 little-endian), indice JSON, poi i blocchi delle linee.
+# L'indice associa a ogni JourneyPatternId la coppia [offset, lunghezza] del suo blocco, relativa all'inizio
+# dei dati; ogni blocco è l'output di parse_line serializzato in JSON compatto e compresso con zlib.
+# L'indice contiene anche, per ogni linea, un riepilogo (info e details senza fermate né geometria) e
+# la sequenza ordinata dei codici delle fermate, da cui si costruiscono gli indici inversi senza decomprimere i blocchi.
+SNAPSHOT_MAGIC = b"ONBLNS01"
+_HEADER = struct.Struct("<I")
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "onboard_lines.snapshot")
+# Percorso alternativo configurabile, es. per un file generato durante il deploy.
+SNAPSHOT_PATH = os.environ.get("ONBOARD_LINE_SNAPSHOT", DEFAULT_SNAPSHOT_PATH)
+
+
+def summarize_line(line):
+    """
+    Restituisce (riepilogo, codici_fermate) di una linea elaborata da parse_line: il riepilogo contiene
+    'info' e 'details' senza fermate né geometria, i codici seguono l'ordine del percorso.
+    """
+    details = line.get("details") or {}
+    riepilogo = {
+        "info": line.get("info"),
+        "details": {key: value for key, value in details.items() if key not in ("stops", "geometry")},
+    }
+    codici = [
+        stop["info"]["id"] for stop in details.get("stops") or ()
+        if isinstance(stop, dict) and (stop.get("info") or {}).get("id") is not None
+    ]
+    return riepilogo, codici
+
+
+def write_snapshot(path, lines, metadata=None):
+    """
+    Scrive lo snapshot in 'path' a partire da 'lines', un dizionario JourneyPatternId -> output di parse_line.
+    Il file viene prima scritto accanto alla destinazione e poi rinominato, così un server
+    in esecuzione non legge mai uno snapshot scritto a metà.
+    """
+    blocchi = []
+    indice = {}
+    riepiloghi = {}
+    fermate = {}
+    offset = 0
+    for line_id, line in lines.items():
+        blocco = zlib.compress(json.dumps(line, separators=(',', ':')).encode('utf-8'), 9)
+        indice[line_id] = [offset, len(blocco)]
+        blocchi.append(blocco)
+        offset += len(blocco)
+        riepiloghi[line_id], fermate[line_id] = summarize_line(line)
+
+    indice_bytes = json.dumps({
+        "metadata": metadata or {},
+        "lines": indice,
+        "lineSummaries": riepiloghi,
+        "lineStops": fermate,
+    }, separators=(',', ':')).encode('utf-8')
+    temporaneo = f"{path}.tmp"
+    with open(temporaneo, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(_HEADER.pack(len(indice_bytes)))
+        f.write(indice_bytes)
+        for blocco in blocchi:
+            f.write(blocco)
+    os.replace(temporaneo, path)
+
+
+class LineSnapshot:
+    """
+    Snapshot delle linee mappato in memoria: all'apertura si legge solo l'indice, mentre
+    i blocchi delle singole linee vengono decompressi su richiesta direttamente dalla mappa.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} non è uno snapshot delle linee valido")
+        inizio_indice = len(SNAPSHOT_MAGIC) + _HEADER.size
+        if len(self._mm) < inizio_indice:
+            raise ValueError(f"{path} è troncato: intestazione incompleta")
+        (lunghezza_indice,) = _HEADER.unpack_from(self._mm, len(SNAPSHOT_MAGIC))
+        if len(self._mm) < inizio_indice + lunghezza_indice:
+            raise ValueError(f"{path} è troncato: indice incompleto")
+        indice = json.loads(self._mm[inizio_indice:inizio_indice + lunghezza_indice])
+
+        self.path = path
+        self.metadata = indice.get("metadata", {})
+        self._index = indice["lines"]
+        self._data_start = inizio_indice + lunghezza_indice
+        self._summaries = indice.get("lineSummaries")
+        self._line_stops = indice.get("lineStops")
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, line_id):
+        return line_id in self._index
+
+    def line_ids(self):
+        return list(self._index)
+
+    def summaries(self):
+        """
+        Restituisce (riepiloghi, fermate_per_linea) per tutte le linee, come scritti da summarize_line.
+        Gli snapshot generati prima dell'introduzione dei riepiloghi vengono decompressi una volta per ricavarli.
+        """
+        if self._summaries is None or self._line_stops is None:
+            self._summaries, self._line_stops = {}, {}
+            for line_id in self._index:
+                self._summaries[line_id], self._line_stops[line_id] = summarize_line(self.get(line_id))
+        return self._summaries, self._line_stops
+
+    def get(self, line_id):
+        """
+        Restituisce una nuova copia della linea elaborata (modificabile dal chiamante), oppure None.
+        Un blocco danneggiato solleva zlib.error (o ValueError se il JSON decompresso non è valido).
+        """
+        posizione = self._index.get(line_id)
+        if posizione is None:
+            return None
+        offset, lunghezza = posizione
+        inizio = self._data_start + offset
+        return json.loads(zlib.decompress(self._mm[inizio:inizio + lunghezza]))
+
+
+@lru_cache(maxsize=None)
+def get_line_snapshot():
+    """
+    Apre lo snapshot una sola volta per processo. Restituisce None se il file non esiste
+    o non è valido: in quel caso le linee vengono sempre richieste all'API upstream.
+    """
+    if not os.path.exists(SNAPSHOT_PATH):
+        return None
+    try:
+        snapshot = LineSnapshot(SNAPSHOT_PATH)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        print(f"Attenzione: impossibile caricare lo snapshot delle linee {SNAPSHOT_PATH}: {e}")
+        return None
+    print(f"Snapshot delle linee caricato: {len(snapshot)} linee da {SNAPSHOT_PATH}")
+    return snapshot
@@ -0,0 +1,41 @@
+import zlib
+from functools import lru_cache
+
+from api.snapshot.line_snapshot import get_line_snapshot
+
+
+class LineStopIndex:
+    """
+    Indici inversi ricavati dallo snapshot delle linee:
+    linea -> codici delle fermate nell'ordine del percorso, fermata -> linee (con direzione) che la servono.
+    """
+
+    def __init__(self, snapshot):
+        self.line_summaries, self.line_stops = snapshot.summaries()
+        self.stop_lines = {}
+        for line_id, stop_codes in self.line_stops.items():
+            # Una fermata può comparire più volte nello stesso percorso (es. capolinea circolari): la si conta una volta.
+            for stop_code in dict.fromkeys(stop_codes):
+                self.stop_lines.setdefault(stop_code, []).append(line_id)
+
+    def lines_at_stop(self, stop_code):
+        """Restituisce i riepiloghi delle linee che servono la fermata, nell'ordine dello snapshot."""
+        return [self.line_summaries[line_id] for line_id in self.stop_lines.get(stop_code, ())]
+
+    def stops_of_line(self, line_id):
+        """Restituisce i codici ordinati delle fermate della linea, oppure None se la linea non è nello snapshot."""
+        return self.line_stops.get(line_id)
+
+
+@lru_cache(maxsize=None)
+def get_line_stop_index():
+    """Costruisce gli indici inversi una sola volta per processo; None se lo snapshot delle linee non è disponibile."""
+    snapshot = get_line_snapshot()
+    if snapshot is None:
+        return None
+    try:
+        return LineStopIndex(snapshot)
+    except (zlib.error, ValueError, KeyError, TypeError) as e:
+        # Gli snapshot senza riepiloghi vengono decompressi per intero: un blocco danneggiato disattiva gli indici (503).
+        print(f"Attenzione: impossibile costruire gli indici inversi dallo snapshot delle linee: {e}")
+        return None
@@ -0,0 +1,34 @@
+import asyncio
+
+from api.index import app
+
+
+async def call_app(path, query_string=b"", method="GET", headers=()):
+    """
+    Invia una richiesta HTTP all'app ASGI e raccoglie la risposta.
+    Restituisce (status, headers, body): gli header come dizionario con nomi in minuscolo (str).
+    """
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query_string,
+        "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+    }
+    messages = []
+
+    async def receive():
+        await asyncio.Event().wait()  # Il client non si disconnette mai
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in start["headers"]}
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], headers, body
+
+
+def request(path, query_string=b"", method="GET", headers=()):
+    return asyncio.run(call_app(path, query_string, method, headers))
@@ -0,0 +1,60 @@
+import http.server
+import json
+import threading
+import time
+
+
+class StubUpstream:
+    """
+    Server HTTP locale che sostituisce l'API upstream nei test.
+    'respond(path)' restituisce (status, payload) per ogni richiesta; ogni risposta arriva dopo 'delay' secondi,
+    così le richieste concorrenti si sovrappongono. I percorsi ricevuti vengono registrati in 'hits'.
+    """
+
+    def __init__(self, respond=None, delay=0.2):
+        self.respond = respond or (lambda path: (200, {"path": path}))
+        self.delay = delay
+        self.hits = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.hits.append(self.path)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.delay)
+                    status, payload = stub.respond(self.path)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,95 @@
+import gzip
+import unittest
+from unittest import mock
+
+from api import constants
+from api.caching.ttl_cache import TTLCache
+from api.response.etag import compute_etag, etag_matches
+from asgi_client import request
+
+CONTENT_HEADERS = ("content-length", "content-type", "content-encoding")
+
+JOURNEY_PATTERNS = {"JourneyPatterns": [
+    {"JourneyPatternId": f"{i}|0", "Direction": "0",
+     "Line": {"LineId": str(i), "LineDescription": f"Tram {i} Duomo M1 M3 - Precotto", "TransportMode": 1}}
+    for i in range(1, 31)
+]}
+
+
+class EtagMatchesTest(unittest.TestCase):
+
+    def test_weak_comparison_ignores_encoding_suffix(self):
+        etag = compute_etag(b"body", content_encoding="gzip")
+        self.assertTrue(etag_matches(compute_etag(b"body"), etag))
+        self.assertTrue(etag_matches(f'W/{compute_etag(b"body", content_encoding="br")}', etag))
+        self.assertTrue(etag_matches(f'"other", {etag}', etag))
+        self.assertTrue(etag_matches("*", etag))
+        self.assertFalse(etag_matches(compute_etag(b"other"), etag))
+        self.assertFalse(etag_matches(None, etag))
+
+
+class ConditionalRequestTestMixin:
+    path = None
+
+    def test_identity_and_gzip_tags_describe_the_uncompressed_body(self):
+        status, headers, body = request(self.path)
+        self.assertEqual(status, 200)
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(headers["etag"], compute_etag(body))
+
+        status, gz_headers, gz_body = request(self.path, headers=[("accept-encoding", "gzip")])
+        self.assertEqual(status, 200)
+        self.assertEqual(gz_headers["content-encoding"], "gzip")
+        self.assertEqual(gzip.decompress(gz_body), body)
+        self.assertEqual(gz_headers["etag"], compute_etag(body, content_encoding="gzip"))
+
+    def test_pretty_tag_is_computed_on_the_indented_body(self):
+        _, headers, body = request(self.path, b"pretty=1", headers=[("accept-encoding", "gzip")])
+        self.assertEqual(headers["etag"], compute_etag(gzip.decompress(body), content_encoding="gzip"))
+
+    def test_matching_tag_returns_304_without_body(self):
+        _, headers, _ = request(self.path)
+        # Il client ha in cache la variante non compressa e ora accetta gzip: stessa rappresentazione.
+        status, headers_304, body = request(self.path, headers=[
+            ("accept-encoding", "gzip"), ("if-none-match", headers["etag"])
+        ])
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b"")
+        for name in CONTENT_HEADERS:
+            self.assertNotIn(name, headers_304)
+        self.assertEqual(headers_304["etag"], headers["etag"][:-1] + '-gzip"')
+        self.assertIn("cache-control", headers_304)
+
+    def test_mismatching_tag_returns_200(self):
+        status, headers, body = request(self.path, headers=[("if-none-match", '"stale-tag"')])
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-length"], str(len(body)))
+        self.assertGreater(len(body), 0)
+
+
+class StopsConditionalRequestTest(ConditionalRequestTestMixin, unittest.TestCase):
+    path = "/stops"
+
+
+class LinesConditionalRequestTest(ConditionalRequestTestMixin, unittest.TestCase):
+    path = "/lines"
+
+    def setUp(self):
+        self.fetch = mock.Mock(return_value=(JOURNEY_PATTERNS, "application/json", 200))
+        for patcher in (
+            mock.patch.object(constants, "UPSTREAM_CACHE", TTLCache(16)),
+            mock.patch.object(constants, "_fetch", self.fetch),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_errors_are_not_stored_and_carry_no_tag(self):
+        self.fetch.return_value = ({"error": "BAD_GATEWAY"}, "application/json", 502)
+        status, headers, _ = request("/lines", headers=[("if-none-match", "*")])
+        self.assertEqual(status, 502)
+        self.assertEqual(headers["cache-control"], "no-store")
+        self.assertNotIn("etag", headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+from api.get_line_details import get_line_details as line_details_module
+from api.get_line_stops.get_line_stops import get_line_stops
+from api.get_stop_lines.get_stop_lines import get_stop_lines
+from api.snapshot import line_snapshot, reverse_index
+from api.snapshot.line_snapshot import SNAPSHOT_MAGIC, LineSnapshot, get_line_snapshot, write_snapshot
+
+LINE = {
+    "info": {"id": "1|0", "code": "1"},
+    "details": {
+        "direction": "Roserio",
+        "stops": [{"info": {"id": "11111"}}, {"info": {"id": "22222"}}],
+        "geometry": [[45.46, 9.18], [45.47, 9.19]],
+    },
+}
+
+
+def _write_raw(path, index, blobs):
+    # Scrive uno snapshot a mano, per simulare file danneggiati o generati da versioni precedenti.
+    index_bytes = json.dumps(index).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + struct.pack("<I", len(index_bytes)) + index_bytes + b"".join(blobs))
+
+
+class LineSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "lines.snapshot")
+        get_line_snapshot.cache_clear()
+        reverse_index.get_line_stop_index.cache_clear()
+        patcher = mock.patch.object(line_snapshot, "SNAPSHOT_PATH", self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(get_line_snapshot.cache_clear)
+        self.addCleanup(reverse_index.get_line_stop_index.cache_clear)
+        self.addCleanup(self.tmp.cleanup)
+
+    def _write_corrupt_blob(self, with_summaries):
+        blob = b"not zlib data"
+        index = {"metadata": {}, "lines": {"1|0": [0, len(blob)]}}
+        if with_summaries:
+            index["lineSummaries"], index["lineStops"] = {}, {}
+            index["lineSummaries"]["1|0"], index["lineStops"]["1|0"] = line_snapshot.summarize_line(LINE)
+        _write_raw(self.path, index, [blob])
+
+    def test_valid_snapshot_round_trip(self):
+        write_snapshot(self.path, {"1|0": LINE}, metadata={"lines": 1})
+        snapshot = get_line_snapshot()
+        self.assertIsNotNone(snapshot)
+        self.assertEqual(len(snapshot), 1)
+        self.assertEqual(snapshot.metadata, {"lines": 1})
+        self.assertEqual(snapshot.get("1|0"), LINE)
+        self.assertIsNone(snapshot.get("missing"))
+
+        fermate, _, status = get_line_stops("1|0")
+        self.assertEqual(status, 200)
+        self.assertEqual([fermata["info"]["id"] for fermata in fermate], ["11111", "22222"])
+
+    def test_truncated_header_is_rejected(self):
+        with open(self.path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + b"\x01")  # 9 bytes: magic valido, lunghezza dell'indice incompleta
+        with self.assertRaises(ValueError):
+            LineSnapshot(self.path)
+        self.assertIsNone(get_line_snapshot())
+
+    def test_truncated_index_is_rejected(self):
+        write_snapshot(self.path, {"1|0": LINE})
+        with open(self.path, "r+b") as f:
+            f.truncate(len(SNAPSHOT_MAGIC) + 4 + 10)
+        self.assertIsNone(get_line_snapshot())
+
+    def test_corrupt_blob_falls_back_to_upstream(self):
+        self._write_corrupt_blob(with_summaries=True)
+        snapshot = get_line_snapshot()
+        with self.assertRaises(zlib.error):
+            snapshot.get("1|0")
+
+        upstream = mock.AsyncMock(return_value=({"error": "upstream"}, "application/json", 502))
+        with mock.patch.object(line_details_module, "make_request_async", upstream):
+            data, _, status = asyncio.run(line_details_module.get_line_details("1|0"))
+        upstream.assert_awaited_once()
+        self.assertEqual(status, 502)
+
+    def test_corrupt_blob_without_summaries_disables_reverse_index(self):
+        self._write_corrupt_blob(with_summaries=False)
+        self.assertIsNotNone(get_line_snapshot())
+        self.assertEqual(get_line_stops("1|0")[2], 503)
+        self.assertEqual(get_stop_lines("11111")[2], 503)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import gzip
+import json
+import unittest
+from unittest import mock
+
+from api.response import encoding, streaming
+from api.response.encoding import compress_stream
+from api.response.pagination import MAX_PAGE_SIZE, paginate, parse_page_params
+from api.response.streaming import StreamingBody, parse_stream_param, serialize_items
+from asgi_client import request
+
+ITEMS = [{"id": i, "name": f"Fermata {i}", "coords": [45.4 + i / 1000, 9.1]} for i in range(50)]
+
+
+class PaginationTest(unittest.TestCase):
+
+    def test_page_params_defaults_and_cap(self):
+        self.assertEqual(parse_page_params(None, None), (MAX_PAGE_SIZE, 0))
+        self.assertEqual(parse_page_params("10", "20"), (10, 20))
+        self.assertEqual(parse_page_params("5000", None), (1000, 0))
+        for limit, cursor in (("0", None), ("-1", None), ("10", "-5"), ("abc", None), ("10", "x")):
+            with self.subTest(limit=limit, cursor=cursor):
+                with self.assertRaises(ValueError):
+                    parse_page_params(limit, cursor)
+
+    def test_cursor_round_trip_covers_every_item_once(self):
+        items = list(range(2500))
+        for source in (lambda: items, lambda: iter(items)):  # Liste e generatori
+            raccolti = []
+            cursor = None
+            pagine = 0
+            while True:
+                limit, offset = parse_page_params("1000", cursor)
+                pagina = paginate(source(), limit, offset)
+                raccolti.extend(pagina["items"])
+                pagine += 1
+                cursor = pagina["nextCursor"]
+                if cursor is None:
+                    break
+            self.assertEqual(raccolti, items)
+            self.assertEqual(pagine, 3)
+
+    def test_exact_multiple_has_no_trailing_empty_page(self):
+        self.assertEqual(paginate(range(10), 5, 5), {"items": [5, 6, 7, 8, 9], "nextCursor": None})
+        self.assertEqual(paginate(range(10), 5, 10), {"items": [], "nextCursor": None})
+
+
+class StreamingBodyTest(unittest.TestCase):
+
+    def test_stream_param(self):
+        self.assertIsNone(parse_stream_param(None))
+        self.assertIsNone(parse_stream_param("xml"))
+        self.assertEqual(parse_stream_param("1"), "json")
+        self.assertEqual(parse_stream_param("NDJSON"), "ndjson")
+
+    def test_json_framing_matches_json_dumps(self):
+        for items in (ITEMS, ITEMS[:1], []):
+            with self.subTest(count=len(items)):
+                self.assertEqual(serialize_items(iter(items)), json.dumps(items, separators=(',', ':')).encode())
+                self.assertEqual(serialize_items(iter(items), pretty=True), json.dumps(items, indent=2).encode())
+
+    def test_small_chunks_concatenate_to_the_same_document(self):
+        with mock.patch.object(streaming, "STREAM_CHUNK_SIZE", 100):
+            chunks = list(StreamingBody(iter(ITEMS)).chunks())
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(json.loads(b"".join(chunks)), ITEMS)
+
+    def test_ndjson_framing_is_one_compact_object_per_line(self):
+        self.assertEqual(StreamingBody(ITEMS, "ndjson").content_type, "application/x-ndjson")
+        for pretty in (False, True):  # pretty viene ignorato: ogni oggetto deve stare su una riga
+            righe = b"".join(StreamingBody(iter(ITEMS), "ndjson").chunks(pretty)).decode().split("\n")
+            self.assertEqual(righe[-1], "")
+            self.assertEqual([json.loads(riga) for riga in righe[:-1]], ITEMS)
+        self.assertEqual(b"".join(StreamingBody(iter([]), "ndjson").chunks()), b"")
+
+
+class CompressStreamTest(unittest.TestCase):
+
+    def _chunks(self):
+        with mock.patch.object(streaming, "STREAM_CHUNK_SIZE", 256):
+            return list(StreamingBody(iter(ITEMS)).chunks())
+
+    def test_gzip_stream_decompresses_to_the_same_bytes(self):
+        chunks = self._chunks()
+        self.assertEqual(gzip.decompress(b"".join(compress_stream(iter(chunks), "gzip"))), b"".join(chunks))
+
+    @unittest.skipIf(encoding.brotli is None, "pacchetto brotli non installato")
+    def test_brotli_stream_decompresses_to_the_same_bytes(self):
+        chunks = self._chunks()
+        compressi = b"".join(compress_stream(iter(chunks), "br"))
+        self.assertEqual(encoding.brotli.decompress(compressi), b"".join(chunks))
+
+    def test_identity_stream_is_unchanged(self):
+        chunks = self._chunks()
+        self.assertEqual(list(compress_stream(iter(chunks), None)), chunks)
+
+
+class StopsPaginationEndpointTest(unittest.TestCase):
+
+    def test_pages_and_stream_match_the_full_list(self):
+        _, _, body = request("/stops")
+        fermate = json.loads(body)
+
+        status, _, body = request("/stops", b"limit=2&cursor=3")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), {"items": fermate[3:5], "nextCursor": "5"})
+
+        status, headers, body = request("/stops", b"stream=ndjson", headers=[("accept-encoding", "gzip")])
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-type"], "application/x-ndjson")
+        self.assertNotIn("content-length", headers)
+        righe = gzip.decompress(body).decode().splitlines()
+        self.assertEqual([json.loads(riga) for riga in righe], fermate)
+
+    def test_invalid_limit_is_rejected(self):
+        status, headers, _ = request("/stops", b"limit=0")
+        self.assertEqual(status, 400)
+        self.assertEqual(headers["cache-control"], "no-store")
+
+
+if __name__ == "__main__":
+    unittest.main()
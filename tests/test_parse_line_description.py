@@ -0,0 +1,44 @@
+import json
+import os
+import unittest
+
+from api.parsing.lines.parse_line import line_description_cache_info, parse_line_description
+
+# Corpus di riferimento registrato con il parser originale (prima della riscrittura a regex precompilate
+# e dispatch per iniziale): descrizione, flag parsing_da_stazione e tupla (codice, inizio, fine) attesa.
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "line_descriptions.json")
+
+
+class ParseLineDescriptionGoldenTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FIXTURE_PATH, "r", encoding="utf-8") as f:
+            cls.cases = json.load(f)
+
+    def test_matches_recorded_baseline(self):
+        for case in self.cases:
+            with self.subTest(description=case["description"], parsing_da_stazione=case["parsing_da_stazione"]):
+                result = parse_line_description(case["description"], case["parsing_da_stazione"])
+                self.assertEqual(list(result), case["expected"])
+
+    def test_memoized_results_are_stable(self):
+        # La seconda chiamata arriva dalla cache: deve restituire lo stesso risultato della prima.
+        for case in self.cases[:50]:
+            first = parse_line_description(case["description"], case["parsing_da_stazione"])
+            second = parse_line_description(case["description"], case["parsing_da_stazione"])
+            self.assertEqual(first, second)
+
+    def test_repeated_description_is_a_cache_hit(self):
+        descrizione = "Duomo M1 M3 - Precotto (Cache hit test)"
+        parse_line_description(descrizione)
+        prima = line_description_cache_info()["descriptions"]
+        parse_line_description(descrizione)
+        dopo = line_description_cache_info()["descriptions"]
+        self.assertEqual(dopo["hits"], prima["hits"] + 1)
+        self.assertEqual(dopo["misses"], prima["misses"])
+        self.assertEqual(dopo["size"], prima["size"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from api.caching import prewarm
+from api.caching.prewarm import DecayingTopK, PrewarmScheduler
+
+HALF_LIFE = 100
+
+
+class FakeClock:
+    """Sostituisce il modulo time in prewarm: il tempo avanza solo con advance()."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class PrewarmTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(prewarm, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class DecayingTopKTest(PrewarmTestCase):
+
+    def test_scores_halve_every_half_life(self):
+        counters = DecayingTopK(10, HALF_LIFE)
+        for _ in range(4):
+            counters.hit("a")
+        self.assertEqual(counters.top(1), [("a", 4.0)])
+        self.clock.advance(HALF_LIFE)
+        self.assertAlmostEqual(counters.top(1)[0][1], 2.0)
+        counters.hit("a")
+        self.clock.advance(HALF_LIFE)
+        self.assertAlmostEqual(counters.top(1)[0][1], 1.5)
+
+    def test_top_orders_by_score_and_applies_min_score(self):
+        counters = DecayingTopK(10, HALF_LIFE)
+        for key, hits in (("a", 1), ("b", 5), ("c", 3)):
+            for _ in range(hits):
+                counters.hit(key)
+        self.assertEqual([key for key, _ in counters.top(2)], ["b", "c"])
+        self.assertEqual([key for key, _ in counters.top(10, min_score=2)], ["b", "c"])
+
+    def test_table_is_trimmed_to_capacity_when_it_doubles(self):
+        counters = DecayingTopK(2, HALF_LIFE)
+        for _ in range(3):
+            counters.hit("hot")
+        for key in ("x", "y", "z"):
+            self.assertEqual(counters.hit(key), [])
+        scartate = counters.hit("w")  # Quinta chiave: la tabella supera 2 * capacity
+        self.assertEqual(len(counters), 2)
+        self.assertEqual(len(scartate), 3)
+        self.assertNotIn("hot", scartate)
+
+    def test_prune_drops_only_idle_keys_below_min_score(self):
+        counters = DecayingTopK(10, HALF_LIFE)
+        counters.hit("once")
+        for _ in range(8):
+            counters.hit("hot")
+        self.assertEqual(counters.prune(2, HALF_LIFE), [])  # "once" è appena stata vista
+        self.clock.advance(HALF_LIFE)
+        self.assertEqual(counters.prune(2, HALF_LIFE), ["once"])
+        self.clock.advance(2 * HALF_LIFE)  # "hot" scende a 1
+        self.assertEqual(counters.prune(2, HALF_LIFE), ["hot"])
+        self.assertEqual(len(counters), 0)
+
+
+class PrewarmSchedulerTest(PrewarmTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.expiry = {}
+        self.refreshed = []
+        self.scheduler = PrewarmScheduler(self.expiry.get, self.refreshed.append, top_n=10, budget_per_minute=2,
+                                          half_life=HALF_LIFE, interval=0, lead_fraction=0.2, min_score=2)
+
+    def _hit(self, key, times, ttl=60):
+        for _ in range(times):
+            self.scheduler._specs[key] = (f"spec-{key}", ttl)
+            self.scheduler.counters.hit(key)
+
+    def test_only_hot_keys_close_to_expiry_are_refreshed(self):
+        self._hit("due", 5)
+        self._hit("fresh", 5)
+        self._hit("missing", 4)
+        self._hit("cold", 1)
+        self.expiry.update({"due": 10, "fresh": 50, "cold": 0})  # 20% di 60 s = 12 s
+        self.assertEqual(self.scheduler.tick(), 2)
+        self.assertEqual(self.refreshed, ["spec-due", "spec-missing"])
+
+    def test_token_bucket_limits_refreshes_per_minute(self):
+        for i in range(5):
+            self._hit(f"key{i}", 10 - i)
+        self.assertEqual(self.scheduler.tick(), 2)  # Budget iniziale: 2 richieste
+        self.assertEqual(self.refreshed, ["spec-key0", "spec-key1"])
+        self.assertEqual(self.scheduler.tick(), 0)
+        self.clock.advance(30)  # Mezzo minuto: un solo token
+        self.assertEqual(self.scheduler.tick(), 1)
+        self.clock.advance(120)  # Due minuti: il bucket non supera comunque il budget al minuto
+        self.assertEqual(self.scheduler.tick(), 2)
+
+    def test_task_exits_when_no_key_qualifies_and_restarts_on_track(self):
+        self.expiry["key"] = 1000  # Mai in scadenza: tick non aggiorna nulla
+
+        async def main():
+            for _ in range(3):
+                self.scheduler.track("key", "spec", 60)
+            task = self.scheduler._task
+            for _ in range(5):
+                await asyncio.sleep(0)
+            running = not task.done()
+
+            self.clock.advance(10 * HALF_LIFE)
+            await asyncio.wait_for(task, 1)
+            stato_finale = len(self.scheduler.counters), dict(self.scheduler._specs)
+
+            self.scheduler.track("key", "spec", 60)
+            restarted = self.scheduler._task is not task and not self.scheduler._task.done()
+            await asyncio.wait_for(self.scheduler._task, 1)  # Una sola richiesta: punteggio sotto min_score
+            return running, stato_finale, restarted
+
+        running, stato_finale, restarted = asyncio.run(main())
+        self.assertTrue(running)
+        self.assertEqual(stato_finale, (0, {}))
+        self.assertTrue(restarted)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from api.routing.router import Router
+from asgi_client import request
+
+
+def _handler(path_params, query_params):
+    return path_params, "application/json", 200
+
+
+class RouterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.router = Router()
+        self.static = self.router.add("/stops", _handler)
+        self.nearby = self.router.add("/stops/nearby", _handler)
+        self.details = self.router.add("/stops/{stop_id}", _handler)
+        self.lines = self.router.add("/stops/{stop_id}/lines", _handler)
+
+    def test_static_route_wins_over_parameter(self):
+        self.assertEqual(self.router.resolve("/stops"), (self.static, {}))
+        self.assertEqual(self.router.resolve("/stops/nearby"), (self.nearby, {}))
+
+    def test_dynamic_route_extracts_parameters(self):
+        self.assertEqual(self.router.resolve("/stops/11111"), (self.details, {"stop_id": "11111"}))
+        self.assertEqual(self.router.resolve("/stops/11111/lines"), (self.lines, {"stop_id": "11111"}))
+
+    def test_unknown_paths_do_not_resolve(self):
+        for path in ("/lines", "/stops/11111/unknown", "/stops/11111/lines/extra", "/stops//lines", "/"):
+            with self.subTest(path=path):
+                self.assertEqual(self.router.resolve(path), (None, None))
+
+    def test_leading_parameter_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.router.add("/{lang}/stops", _handler)
+
+
+class AppRoutingTest(unittest.TestCase):
+
+    def test_method_not_allowed_lists_allowed_methods(self):
+        status, headers, body = request("/stops", method="POST")
+        self.assertEqual(status, 405)
+        self.assertEqual(headers["allow"], "GET")
+        self.assertEqual(headers["cache-control"], "no-store")
+        self.assertIn(b"METHOD_NOT_ALLOWED", body)
+
+    def test_unknown_path_is_not_found(self):
+        status, headers, body = request("/does/not/exist")
+        self.assertEqual(status, 404)
+        self.assertEqual(headers["cache-control"], "no-store")
+        self.assertIn(b"NOT_FOUND", body)
+
+    def test_static_route_is_served(self):
+        status, headers, _ = request("/")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-type"], "application/json")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+from api import constants
+from api.caching.single_flight import AsyncSingleFlight, SingleFlight
+from api.caching.ttl_cache import TTLCache
+from stub_upstream import StubUpstream
+
+CALLERS = 10
+
+
+class UpstreamCoalescingTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(constants, "UPSTREAM_CACHE", TTLCache(64))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _concurrent_make_request(self, url, params, **kwargs):
+        barrier = threading.Barrier(CALLERS)
+        results = [None] * CALLERS
+
+        def caller(i):
+            barrier.wait()
+            results[i] = constants.make_request(url, params=params, **kwargs)
+
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(CALLERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_make_request_coalesces_identical_calls(self):
+        with StubUpstream() as stub:
+            results = self._concurrent_make_request(f"{stub.base_url}/stops/1", {"a": "1"})
+        self.assertEqual(len(stub.hits), 1)
+        self.assertEqual(results, [({"path": "/stops/1?a=1"}, "application/json", 200)] * CALLERS)
+
+    def test_make_request_async_coalesces_identical_calls(self):
+        async def main(url):
+            return await asyncio.gather(*(
+                constants.make_request_async(url, params={"a": "1"}) for _ in range(CALLERS)
+            ))
+
+        with StubUpstream() as stub:
+            results = asyncio.run(main(f"{stub.base_url}/stops/1"))
+        self.assertEqual(len(stub.hits), 1)
+        self.assertEqual(results, [({"path": "/stops/1?a=1"}, "application/json", 200)] * CALLERS)
+
+    def test_different_params_are_not_coalesced(self):
+        async def main(url):
+            return await asyncio.gather(*(
+                constants.make_request_async(url, params={"a": str(i)}) for i in range(3)
+            ))
+
+        with StubUpstream() as stub:
+            asyncio.run(main(f"{stub.base_url}/stops/1"))
+        self.assertEqual(sorted(stub.hits), ["/stops/1?a=0", "/stops/1?a=1", "/stops/1?a=2"])
+
+    def test_upstream_error_is_shared_but_not_cached(self):
+        with StubUpstream(respond=lambda path: (500, {"error": "down"})) as stub:
+            url = f"{stub.base_url}/stops/1"
+            results = self._concurrent_make_request(url, None, cache_ttl=60)
+            self.assertEqual(len(stub.hits), 1)
+            self.assertEqual({result[2] for result in results}, {502})
+            constants.make_request(url, cache_ttl=60)
+            self.assertEqual(len(stub.hits), 2)  # L'errore non è rimasto in cache
+
+
+class SingleFlightErrorTest(unittest.TestCase):
+
+    def test_leader_exception_reaches_every_waiter_and_is_forgotten(self):
+        flights = SingleFlight()
+        calls = []
+        errors = []
+        barrier = threading.Barrier(CALLERS)
+
+        def failing():
+            calls.append(1)
+            time.sleep(0.2)
+            raise RuntimeError("upstream exploded")
+
+        def caller():
+            barrier.wait()
+            try:
+                flights.do("key", failing)
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=caller) for _ in range(CALLERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(errors), CALLERS)
+        self.assertTrue(all(error is errors[0] for error in errors))
+        self.assertEqual(flights.do("key", lambda: "recovered"), "recovered")
+
+    def test_async_leader_exception_reaches_every_waiter_and_is_forgotten(self):
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            raise RuntimeError("upstream exploded")
+
+        async def recovered():
+            return "recovered"
+
+        async def main():
+            results = await asyncio.gather(*(flights.do("key", failing) for _ in range(CALLERS)),
+                                           return_exceptions=True)
+            return results, await flights.do("key", recovered)
+
+        results, after = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(after, "recovered")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from api import constants
+from api.caching import sqlite_cache
+from api.caching.cache_backend import CacheBackend
+from api.caching.sqlite_cache import MAINTENANCE_EVERY, SQLiteCache
+from api.constants import _cache_key
+
+URL = "https://upstream.test/stops/1"
+KEY = _cache_key(URL, {"a": "1"})
+WORKERS = 6
+
+
+class FakeClock:
+    """Sostituisce il modulo time in sqlite_cache: il tempo avanza solo con advance()."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def _fill_from_worker(path, barrier, upstream_calls, results):
+    # Eseguito in un processo separato: stessa cache SQLite, _fetch sostituito da uno stub lento.
+    def stub_fetch(url, headers=None, params=None, timeout=15):
+        with upstream_calls.get_lock():
+            upstream_calls.value += 1
+        time.sleep(0.5)
+        return {"stop": url}, "application/json", 200
+
+    constants.UPSTREAM_CACHE = SQLiteCache(path, 16)
+    constants._fetch = stub_fetch
+    barrier.wait()
+    results.put(constants.make_request(URL, params={"a": "1"}, cache_ttl=60, timeout=5))
+
+
+class SQLiteCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "cache.sqlite3")
+        self.cache = SQLiteCache(self.path, 16)
+
+
+class SQLiteCacheWindowsTest(SQLiteCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        patcher = mock.patch.object(sqlite_cache, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ttl_stale_and_evict_windows(self):
+        self.cache.set(KEY, "value", ttl=10, stale_ttl=20)
+
+        self.clock.advance(5)  # Valida
+        self.assertEqual(self.cache.get(KEY), "value")
+        self.assertEqual(self.cache.get_with_age(KEY), ("value", 5, True))
+        self.assertEqual(self.cache.time_to_expiry(KEY), 5)
+
+        self.clock.advance(10)  # Scaduta ma conservata: solo get_with_age la restituisce
+        self.assertIsNone(self.cache.get(KEY))
+        self.assertEqual(self.cache.get_with_age(KEY), ("value", 15, False))
+        self.assertEqual(self.cache.time_to_expiry(KEY), -5)
+        self.assertEqual(len(self.cache), 1)
+
+        self.clock.advance(16)  # Oltre il periodo di conservazione
+        self.assertIsNone(self.cache.get_with_age(KEY))
+        self.assertIsNone(self.cache.time_to_expiry(KEY))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_maintenance_drops_expired_and_excess_entries(self):
+        self.cache.set(_cache_key("https://upstream.test/old", None), "old", ttl=1)
+        self.clock.advance(2)
+        for i in range(MAINTENANCE_EVERY - 1):
+            self.clock.advance(0.001)
+            self.cache.set(_cache_key(f"https://upstream.test/{i}", None), i, ttl=60)
+        righe = self.cache._connection().execute("SELECT key FROM entries").fetchall()
+        self.assertEqual(len(righe), self.cache.maxsize)
+        # Restano le voci memorizzate più di recente.
+        self.assertIsNotNone(self.cache.get(_cache_key(f"https://upstream.test/{MAINTENANCE_EVERY - 2}", None)))
+        self.assertIsNone(self.cache.get(_cache_key("https://upstream.test/0", None)))
+
+    def test_lease_is_exclusive_until_released_or_expired(self):
+        self.assertTrue(self.cache.acquire_fill(KEY, 10))
+        self.assertTrue(self.cache.is_filling(KEY))
+        self.assertFalse(self.cache.acquire_fill(KEY, 10))
+
+        self.clock.advance(10)  # Il detentore non ha rilasciato il lease in tempo: passa di mano
+        self.assertFalse(self.cache.is_filling(KEY))
+        self.assertTrue(self.cache.acquire_fill(KEY, 10))
+
+        self.cache.release_fill(KEY)
+        self.assertFalse(self.cache.is_filling(KEY))
+        self.assertTrue(self.cache.acquire_fill(KEY, 10))
+
+
+class SQLiteFillTest(SQLiteCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(constants, "UPSTREAM_CACHE", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lease_is_released_when_fetch_raises(self):
+        with mock.patch.object(constants, "_fetch", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                constants.make_request(URL, params={"a": "1"}, cache_ttl=60)
+        self.assertFalse(self.cache.is_filling(KEY))
+        self.assertIsNone(self.cache.get(KEY))
+
+    def test_failed_fetch_is_not_cached_and_releases_lease(self):
+        errore = ({"error": "BAD_GATEWAY"}, "application/json", 502)
+        with mock.patch.object(constants, "_fetch", return_value=errore):
+            self.assertEqual(constants.make_request(URL, params={"a": "1"}, cache_ttl=60), errore)
+        self.assertFalse(self.cache.is_filling(KEY))
+        self.assertIsNone(self.cache.get(KEY))
+
+    def test_waiter_fetches_itself_when_lease_expires_without_a_value(self):
+        other_worker = SQLiteCache(self.path, 16)
+        self.assertTrue(other_worker.acquire_fill(KEY, 0.2))  # Lease di un altro processo, mai rilasciato
+        risposta = ({"ok": True}, "application/json", 200)
+        with mock.patch.object(constants, "_fetch", return_value=risposta) as fetch:
+            self.assertEqual(constants.make_request(URL, params={"a": "1"}, cache_ttl=60), risposta)
+        fetch.assert_called_once()
+        self.assertEqual(other_worker.get(KEY), risposta)
+
+
+class SQLiteMultiProcessTest(SQLiteCacheTestCase):
+
+    def test_concurrent_processes_share_a_single_upstream_call(self):
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(WORKERS)
+        upstream_calls = context.Value("i", 0)
+        results = context.Queue()
+        processi = [
+            context.Process(target=_fill_from_worker, args=(self.path, barrier, upstream_calls, results))
+            for _ in range(WORKERS)
+        ]
+        for processo in processi:
+            processo.start()
+        risposte = [results.get(timeout=60) for _ in processi]
+        for processo in processi:
+            processo.join(timeout=60)
+            self.assertEqual(processo.exitcode, 0)
+
+        self.assertEqual(upstream_calls.value, 1)
+        self.assertEqual(risposte, [({"stop": URL}, "application/json", 200)] * WORKERS)
+
+
+class CacheBackendInterfaceTest(unittest.TestCase):
+
+    def test_partial_backend_cannot_be_instantiated(self):
+        class OnlyGet(CacheBackend):
+            def get(self, key, default=None):
+                return default
+
+        with self.assertRaises(TypeError):
+            OnlyGet()
+
+
+class SQLiteCacheLockedReadTest(SQLiteCacheTestCase):
+
+    def test_reads_do_not_wait_on_a_locked_database(self):
+        self.cache.set(KEY, "value", 60)
+        # Un blocco esclusivo in WAL richiede che nessun'altra connessione sia aperta sul file.
+        self.cache._local.connection.close()
+        del self.cache._local.connection
+        lock = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(lock.close)
+        lock.execute("PRAGMA locking_mode=EXCLUSIVE")
+        lock.execute("BEGIN EXCLUSIVE")
+        lock.execute("INSERT INTO fills (key, lease_until) VALUES ('other', 0)")
+
+        start = time.monotonic()
+        self.assertIsNone(self.cache.get_with_age(KEY))
+        self.assertIsNone(self.cache.get(KEY))
+        self.assertIsNone(self.cache.time_to_expiry(KEY))
+        self.assertFalse(self.cache.is_filling(KEY))
+        self.assertLess(time.monotonic() - start, 1)
+
+        lock.execute("ROLLBACK")
+        lock.close()
+        self.assertEqual(self.cache.get(KEY), "value")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from api import constants
+from api.caching import circuit_breaker, ttl_cache
+from api.caching.circuit_breaker import CircuitBreaker
+from api.caching.ttl_cache import TTLCache
+from api.get_lines.get_lines import API_URL as LINES_URL
+from asgi_client import request
+
+URL = "https://upstream.test/status"
+
+
+class FakeClock:
+    """Sostituisce il modulo time nei moduli di cache: il tempo avanza solo con advance()."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class StubFetch:
+    """Sostituisce constants._fetch: conta le chiamate e può trattenerle finché 'release' non viene impostato."""
+
+    def __init__(self, payload_for_call=lambda n: {"version": n}):
+        self.payload_for_call = payload_for_call
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+        self._lock = threading.Lock()
+
+    def __call__(self, url, headers=None, params=None, timeout=15):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        self.release.wait(5)
+        return self.payload_for_call(n), "application/json", 200
+
+
+def _wait_for_background_refreshes():
+    deadline = time.monotonic() + 5
+    while constants._REFRESHING and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class UpstreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.fetch = StubFetch()
+        for patcher in (
+            mock.patch.object(ttl_cache, "time", self.clock),
+            mock.patch.object(circuit_breaker, "time", self.clock),
+            mock.patch.object(constants, "UPSTREAM_CACHE", TTLCache(64)),
+            mock.patch.object(constants, "_HOST_BREAKERS", {}),
+            mock.patch.object(constants, "_fetch", self.fetch),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(_wait_for_background_refreshes)
+
+
+class StaleWhileRevalidateTest(UpstreamTestCase):
+
+    def _get(self):
+        async def main():
+            value = await constants.make_request_async(URL, cache_ttl=10, stale_ttl=60)
+            return value, constants.UPSTREAM_DATA_AGE.get()
+        return asyncio.run(main())
+
+    def test_stale_value_is_served_while_a_single_refresh_runs(self):
+        self.assertEqual(self._get(), (({"version": 1}, "application/json", 200), None))
+
+        self.clock.advance(15)  # Scaduto da 5 secondi, ancora nel periodo di conservazione
+        self.fetch.release.clear()  # L'aggiornamento in background resta in corso
+        for _ in range(3):
+            self.assertEqual(self._get(), (({"version": 1}, "application/json", 200), 15))
+        self.fetch.release.set()
+        _wait_for_background_refreshes()
+        self.assertEqual(self.fetch.calls, 2)  # Una sola richiesta di aggiornamento per tre letture scadute
+
+        self.assertEqual(self._get(), (({"version": 2}, "application/json", 200), None))
+        self.assertEqual(self.fetch.calls, 2)
+
+    def test_value_beyond_stale_window_is_fetched_synchronously(self):
+        self._get()
+        self.clock.advance(10 + 60 + 1)
+        self.assertEqual(self._get(), (({"version": 2}, "application/json", 200), None))
+        self.assertEqual(self.fetch.calls, 2)
+
+    def test_stale_response_is_not_reusable_by_shared_caches(self):
+        self.fetch.payload_for_call = lambda n: {"JourneyPatterns": []}
+        constants.UPSTREAM_CACHE.set(constants._cache_key(LINES_URL, None),
+                                     ({"JourneyPatterns": []}, "application/json", 200),
+                                     constants.LINES_CACHE_TTL, constants.LINES_STALE_TTL)
+        self.clock.advance(constants.LINES_CACHE_TTL + 120)
+
+        status, headers, body = request("/lines")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["age"], str(constants.LINES_CACHE_TTL + 120))
+        self.assertIn("s-maxage=0", headers["cache-control"])
+        self.assertEqual(body, b"[]")
+
+        _wait_for_background_refreshes()
+        status, headers, _ = request("/lines")
+        self.assertNotIn("age", headers)
+        self.assertNotIn("s-maxage=0", headers["cache-control"])
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(circuit_breaker, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+
+    def _fail(self, times):
+        for _ in range(times):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold_and_retries_once_when_half_open(self):
+        self._fail(4)
+        self.assertFalse(self.breaker.is_open)
+        self._fail(1)
+        self.assertTrue(self.breaker.is_open)
+        self.assertFalse(self.breaker.allow())
+
+        self.clock.advance(30)
+        self.assertTrue(self.breaker.allow())  # Richiesta di prova
+        self.assertFalse(self.breaker.allow())  # Una sola alla volta
+
+        self.breaker.record_failure()  # La prova fallisce: il circuito si riapre per altri 30 secondi
+        self.assertFalse(self.breaker.allow())
+        self.clock.advance(29)
+        self.assertFalse(self.breaker.allow())
+
+        self.clock.advance(1)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.is_open)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        self._fail(4)
+        self.breaker.record_success()
+        self._fail(4)
+        self.assertFalse(self.breaker.is_open)
+
+
+class UpstreamBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.session_get = mock.Mock(side_effect=requests.exceptions.ConnectionError("refused"))
+        for patcher in (
+            mock.patch.object(circuit_breaker, "time", self.clock),
+            mock.patch.object(constants, "_HOST_BREAKERS", {}),
+            mock.patch.object(constants._SESSION, "get", self.session_get),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_open_circuit_answers_503_without_calling_upstream(self):
+        for _ in range(constants.UPSTREAM_BREAKER_FAILURES):
+            self.assertEqual(constants._fetch(URL)[2], 502)
+        self.assertEqual(self.session_get.call_count, constants.UPSTREAM_BREAKER_FAILURES)
+
+        data, _, status = constants._fetch(URL)
+        self.assertEqual(status, 503)
+        self.assertEqual(data["error"], "UPSTREAM_UNAVAILABLE")
+        self.assertEqual(self.session_get.call_count, constants.UPSTREAM_BREAKER_FAILURES)
+
+        # Trascorso il reset_timeout passa una richiesta di prova; se ha successo il circuito si richiude.
+        self.clock.advance(constants.UPSTREAM_BREAKER_RESET_TIMEOUT)
+        risposta = mock.Mock(status_code=200)
+        risposta.json.return_value = {"ok": True}
+        self.session_get.side_effect = None
+        self.session_get.return_value = risposta
+        self.assertEqual(constants._fetch(URL), ({"ok": True}, "application/json", 200))
+        self.assertEqual(constants._fetch(URL)[2], 200)
+        self.assertEqual(self.session_get.call_count, constants.UPSTREAM_BREAKER_FAILURES + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
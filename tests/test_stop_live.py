@@ -0,0 +1,160 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from api import index
+from api.get_stop_live.get_stop_live import get_stop_live
+from api.live import stop_poller
+from api.response.sse import EventStreamBody
+
+
+def _line(line_id, waiting_time):
+    return {"info": {"id": line_id, "direction": "0"}, "local": {"waitingTime": waiting_time}}
+
+
+def _stop(*lines):
+    return {"info": {"id": "11111"}, "lines": list(lines)}
+
+
+class FakeStopDetails:
+    """Sostituisce get_stop_details nel poller: restituisce le risposte in sequenza, poi ripete l'ultima."""
+
+    def __init__(self, *stops):
+        self.stops = list(stops)
+        self.calls = 0
+
+    async def __call__(self, stop_id, prewarm=True):
+        self.calls += 1
+        stop = self.stops.pop(0) if len(self.stops) > 1 else self.stops[0]
+        return stop, "application/json", 200
+
+
+class StopLiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.details = FakeStopDetails(_stop(_line("90", "3 min")))
+        for patcher in (
+            mock.patch.object(stop_poller, "get_stop_details", self.details),
+            mock.patch.object(stop_poller, "LIVE_POLL_INTERVAL", 0.01),
+            mock.patch.object(stop_poller, "LIVE_KEEPALIVE_INTERVAL", 5),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_async(self, coro):
+        return asyncio.run(asyncio.wait_for(coro, 10))
+
+
+class WatchLimitTest(StopLiveTestCase):
+
+    def test_concurrent_first_requests_cannot_exceed_the_limit(self):
+        async def main():
+            with mock.patch.object(stop_poller, "LIVE_MAX_WATCHED_STOPS", 2):
+                risposte = [get_stop_live(stop_id) for stop_id in ("1", "2", "3", "1")]
+                watches = dict(stop_poller._WATCHES[asyncio.get_running_loop()])
+                for data, _, status in risposte:
+                    if status == 200:
+                        await data.aclose()
+                return [status for _, _, status in risposte], watches, stop_poller._WATCHES[asyncio.get_running_loop()]
+
+        statuses, watches, after = self.run_async(main())
+        self.assertEqual(statuses, [200, 200, 503, 200])
+        self.assertEqual(sorted(watches), ["1", "2"])
+        self.assertEqual(after, {})
+
+    def test_unstarted_subscription_is_released_on_close(self):
+        async def main():
+            events = stop_poller.watch_stop("1")
+            await events.aclose()
+            await events.aclose()  # Idempotente
+            return stop_poller._WATCHES[asyncio.get_running_loop()]
+
+        self.assertEqual(self.run_async(main()), {})
+
+
+class EventDiffTest(StopLiveTestCase):
+
+    def test_only_changed_waiting_times_are_published(self):
+        self.details.stops = [
+            _stop(_line("90", "3 min"), _line("91", "5 min")),
+            _stop(_line("90", "3 min"), _line("91", "5 min")),  # Nessun cambiamento: nessun evento
+            _stop(_line("90", "2 min"), _line("91", "5 min")),
+            _stop(_line("90", "2 min")),
+        ]
+
+        async def main():
+            events = stop_poller.watch_stop("11111")
+            try:
+                return [await events.__anext__() for _ in range(3)]
+            finally:
+                await events.aclose()
+
+        snapshot, cambio, rimozione = self.run_async(main())
+        self.assertEqual(snapshot, ("snapshot", _stop(_line("90", "3 min"), _line("91", "5 min"))))
+        self.assertEqual(cambio, ("update", {"changed": [_line("90", "2 min")], "removed": []}))
+        self.assertEqual(rimozione, ("update", {"changed": [], "removed": [{"id": "91", "direction": "0"}]}))
+        self.assertEqual(self.details.calls, 4)
+
+    def test_late_subscriber_receives_the_current_snapshot(self):
+        async def main():
+            first = stop_poller.watch_stop("11111")
+            await first.__anext__()
+            second = stop_poller.watch_stop("11111")
+            try:
+                return await second.__anext__()
+            finally:
+                await first.aclose()
+                await second.aclose()
+
+        self.assertEqual(self.run_async(main()), ("snapshot", _stop(_line("90", "3 min"))))
+
+    def test_keep_alive_is_sent_when_nothing_changes(self):
+        async def main():
+            body = EventStreamBody(stop_poller.watch_stop("11111"))
+            chunks = body.chunks()
+            try:
+                return [await chunks.__anext__() for _ in range(2)]
+            finally:
+                await chunks.aclose()
+                await body.aclose()
+
+        with mock.patch.object(stop_poller, "LIVE_KEEPALIVE_INTERVAL", 0.05):
+            snapshot, keep_alive = self.run_async(main())
+        self.assertTrue(snapshot.startswith(b"event: snapshot\ndata: "))
+        self.assertEqual(keep_alive, b": keep-alive\n\n")
+
+
+class EventStreamDisconnectTest(StopLiveTestCase):
+
+    def test_disconnect_closes_the_stream_and_releases_the_watch(self):
+        async def main():
+            disconnesso = asyncio.Event()
+            messaggi = []
+
+            async def receive():
+                await disconnesso.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                messaggi.append(message)
+                if message.get("body"):
+                    disconnesso.set()  # Il client chiude la connessione dopo il primo evento
+
+            body = EventStreamBody(stop_poller.watch_stop("11111"))
+            await index._send_event_stream(body, index.CACHE_CONTROL_EVENT_STREAM, receive, send)
+            return messaggi, stop_poller._WATCHES[asyncio.get_running_loop()]
+
+        messaggi, watches = self.run_async(main())
+        headers = dict(messaggi[0]["headers"])
+        self.assertEqual(headers[b"content-type"], b"text/event-stream")
+        evento = messaggi[1]["body"].decode("utf-8").split("\n")
+        self.assertEqual(evento[0], "event: snapshot")
+        self.assertEqual(json.loads(evento[1][len("data: "):]), _stop(_line("90", "3 min")))
+        # Dopo la disconnessione non si invia più nulla, nemmeno la chiusura del corpo.
+        self.assertEqual(len(messaggi), 2)
+        self.assertEqual(watches, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
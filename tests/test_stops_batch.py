@@ -0,0 +1,111 @@
+import asyncio
+import re
+import unittest
+from unittest import mock
+
+from api import constants
+from api.caching.ttl_cache import TTLCache
+from api.get_stop_details import get_stop_details as stop_details_module
+from api.get_stops_batch import get_stops_batch as batch_module
+from api.get_stops_batch.get_stops_batch import BATCH_CONCURRENCY, MAX_BATCH_SIZE, get_stops_batch
+from asgi_client import request
+from stub_upstream import StubUpstream
+
+GIROMILANO_BASE_URL = "https://giromilano.atm.it/proxy.tpportal/api/tpPortal"
+FAILING_STOP = "13"  # L'upstream risponde 500
+MALFORMED_STOP = "17"  # L'upstream risponde 200 con un payload che parse_stop non riconosce
+
+
+def _linesummary(path):
+    stop_id = re.search(r"/stops/([^/]+)/linesummary", path).group(1)
+    if stop_id == FAILING_STOP:
+        return 500, {"message": "errore interno"}
+    if stop_id == MALFORMED_STOP:
+        return 200, {"Code": stop_id}
+    return 200, {"Code": stop_id, "Description": f"Fermata {stop_id}", "Location": {"X": 9.19, "Y": 45.46},
+                 "Lines": []}
+
+
+class StopsBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubUpstream(_linesummary, delay=0.1)
+        self.stub.__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+        real_make_request_async = stop_details_module.make_request_async
+
+        def make_request_async(url, *args, **kwargs):
+            # Le richieste verso giromilano vengono dirottate sul server locale
+            return real_make_request_async(url.replace(GIROMILANO_BASE_URL, self.stub.base_url), *args, **kwargs)
+
+        for patcher in (
+            mock.patch.object(constants, "UPSTREAM_CACHE", TTLCache(64)),
+            mock.patch.object(constants, "PREWARM_ENABLED", False),
+            mock.patch.object(constants, "_HOST_BREAKERS", {}),
+            # Limite per host più alto di quello del batch: si misura solo BATCH_CONCURRENCY
+            mock.patch.object(constants, "UPSTREAM_MAX_CONCURRENCY_PER_HOST", 32),
+            mock.patch.object(stop_details_module, "make_request_async", make_request_async),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_more_than_max_batch_size_ids_are_rejected(self):
+        ids = ",".join(str(i) for i in range(MAX_BATCH_SIZE + 1))
+        data, _, status = asyncio.run(get_stops_batch(ids))
+        self.assertEqual(status, 400)
+        self.assertEqual(data["status_code"], 400)
+        self.assertEqual(data["error"], "BAD_REQUEST")
+
+        status, headers, _ = request("/stops/batch", f"ids={ids}".encode())
+        self.assertEqual(status, 400)
+        self.assertEqual(headers["cache-control"], "no-store")
+        self.assertEqual(self.stub.hits, [])
+
+    def test_duplicates_and_blanks_do_not_count_towards_the_limit(self):
+        ids = ",".join(str(i) for i in range(MAX_BATCH_SIZE)) + ",0, ,1,"
+        data, _, status = asyncio.run(get_stops_batch(ids))
+        self.assertEqual(status, 200)
+        self.assertEqual(list(data), [str(i) for i in range(MAX_BATCH_SIZE)])
+        self.assertEqual(len(self.stub.hits), MAX_BATCH_SIZE)
+
+    def test_missing_ids_are_rejected(self):
+        for ids in (None, "", " , "):
+            with self.subTest(ids=ids):
+                data, _, status = asyncio.run(get_stops_batch(ids))
+                self.assertEqual(status, 400)
+                self.assertEqual(data["error"], "BAD_REQUEST")
+
+    def test_partial_failures_are_reported_per_stop(self):
+        data, _, status = asyncio.run(get_stops_batch(f"11,{FAILING_STOP},12,{MALFORMED_STOP}"))
+        self.assertEqual(status, 200)
+        self.assertEqual(list(data), ["11", FAILING_STOP, "12", MALFORMED_STOP])
+        self.assertEqual(data["11"]["details"]["name"], "Fermata 11")
+        self.assertEqual(data["12"]["info"]["id"], "12")
+
+        # Errore upstream: la risposta di _fetch viene riportata nel formato di create_error_json
+        self.assertEqual(set(data[FAILING_STOP]), {"status_code", "error", "detail"})
+        self.assertEqual(data[FAILING_STOP]["status_code"], 502)
+        self.assertEqual(data[FAILING_STOP]["error"], "BAD_GATEWAY")
+        self.assertIn("errore interno", data[FAILING_STOP]["detail"])
+
+        # Errore di parsing: la fermata fallisce da sola con un 500
+        self.assertEqual(data[MALFORMED_STOP], constants.create_error_json(
+            500, "INTERNAL_SERVER_ERROR", f"Impossibile elaborare la fermata {MALFORMED_STOP}."
+        ))
+
+    def test_upstream_concurrency_is_bounded(self):
+        ids = ",".join(str(i) for i in range(MAX_BATCH_SIZE))
+        data, _, status = asyncio.run(get_stops_batch(ids))
+        self.assertEqual(status, 200)
+        self.assertEqual(len(self.stub.hits), MAX_BATCH_SIZE)
+        self.assertEqual(self.stub.max_in_flight, BATCH_CONCURRENCY)
+
+    def test_concurrency_follows_the_module_setting(self):
+        with mock.patch.object(batch_module, "BATCH_CONCURRENCY", 3):
+            asyncio.run(get_stops_batch(",".join(str(i) for i in range(10))))
+        self.assertEqual(len(self.stub.hits), 10)
+        self.assertEqual(self.stub.max_in_flight, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
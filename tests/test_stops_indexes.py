@@ -0,0 +1,161 @@
+import json
+import math
+import random
+import time
+import unittest
+
+from api.get_nearby_stops.get_nearby_stops import get_nearby_stops
+from api.get_stops.get_stops import get_stops
+from api.get_stops.search_index import StopsSearchIndex, normalize_name
+from api.get_stops.spatial_index import METERS_PER_DEG_LAT, StopsGridIndex, get_stops_spatial_index
+from api.get_stops.stops_store import STOPS_FILE_PATH, StopsStore, get_stops_store
+from api.response.streaming import serialize_items
+
+
+def _stop(stop_id, name, lon, lat, stop_type="surface"):
+    return {"info": {"id": stop_id}, "details": {"name": name, "type": stop_type},
+            "location": {"X": lon, "Y": lat}}
+
+
+def _distance(lat, lon, stop):
+    # Stessa approssimazione equirettangolare dell'indice.
+    dx = (float(stop["location"]["X"]) - lon) * METERS_PER_DEG_LAT * math.cos(math.radians(lat))
+    dy = (float(stop["location"]["Y"]) - lat) * METERS_PER_DEG_LAT
+    return math.hypot(dx, dy)
+
+
+class StopsStoreTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(STOPS_FILE_PATH, "r", encoding="utf-8") as f:
+            cls.original = json.load(f)
+        cls.store = get_stops_store()
+
+    def test_serialization_is_byte_identical_to_the_file_contents(self):
+        # Stesso risultato della serializzazione diretta della lista letta da onboard_stops.json.
+        self.assertEqual(serialize_items(self.store), json.dumps(self.original, separators=(',', ':')).encode())
+        self.assertEqual(serialize_items(self.store, pretty=True), json.dumps(self.original, indent=2).encode())
+
+    def test_lookup_by_id(self):
+        first = self.original[0]
+        self.assertEqual(self.store.get(first["info"]["id"]), first)
+        self.assertIsNone(self.store.get("does-not-exist"))
+        self.assertEqual(len(self.store), len(self.original))
+
+    def test_stop_without_coordinates_is_kept_but_not_indexed(self):
+        store = StopsStore([_stop("1", "A", "9.1", "45.4"), _stop("2", "B", None, "45.4")])
+        self.assertEqual(store.get("2")["location"], {"X": None, "Y": None})
+        index = StopsGridIndex(store)
+        self.assertEqual(sum(len(cell) for cell in index.cells.values()), 1)
+        self.assertEqual(index.within_bbox(-180, -90, 180, 90), [0])
+
+
+class SpatialIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.store = get_stops_store()
+        cls.index = get_stops_spatial_index()
+        cls.stops = list(cls.store)
+
+    def test_nearest_matches_brute_force(self):
+        rng = random.Random(42)
+        for _ in range(50):
+            lat, lon = rng.uniform(45.35, 45.60), rng.uniform(9.0, 9.35)
+            radius, limit = rng.choice((200, 500, 1500)), rng.choice((1, 5, 20))
+            with self.subTest(lat=lat, lon=lon, radius=radius, limit=limit):
+                attese = sorted((_distance(lat, lon, stop), stop["info"]["id"]) for stop in self.stops
+                                if _distance(lat, lon, stop) <= radius)[:limit]
+                risultati = self.index.nearest(lat, lon, radius, limit)
+                self.assertEqual([stop["info"]["id"] for _, stop in risultati], [stop_id for _, stop_id in attese])
+
+    def test_nearest_near_the_poles_terminates(self):
+        # Regressione: a lat=90 span_x divergeva e la scansione delle celle non terminava.
+        for lat in (90, -90, 89.9999):
+            with self.subTest(lat=lat):
+                start = time.monotonic()
+                self.assertEqual(self.index.nearest(lat, 9.19, 5000, 10), [])
+                self.assertLess(time.monotonic() - start, 2)
+
+    def test_bbox_matches_brute_force(self):
+        min_lon, min_lat, max_lon, max_lat = 9.17, 45.45, 9.21, 45.48
+        attesi = [i for i, stop in enumerate(self.stops)
+                  if min_lon <= float(stop["location"]["X"]) <= max_lon
+                  and min_lat <= float(stop["location"]["Y"]) <= max_lat]
+        self.assertTrue(attesi)
+        self.assertEqual(self.index.within_bbox(min_lon, min_lat, max_lon, max_lat), attesi)
+
+    def test_bbox_is_clamped_to_valid_coordinates(self):
+        # Regressione: 1e308 faceva traboccare il calcolo delle celle (OverflowError).
+        self.assertEqual(len(self.index.within_bbox(-1e308, -1e308, 1e308, 1e308)), len(self.store))
+        self.assertEqual(self.index.within_bbox(200, 0, 300, 10), [])
+        self.assertEqual(self.index.within_bbox(0, 95, 10, 100), [])
+
+
+class StopsEndpointValidationTest(unittest.TestCase):
+
+    def test_nearby_rejects_non_finite_values(self):
+        # Regressione: NaN supera i confronti di intervallo e inf produceva un raggio illimitato.
+        for lat, lon, radius in (("nan", "9.19", None), ("45.46", "nan", None), ("45.46", "9.19", "nan"),
+                                 ("45.46", "9.19", "inf"), ("inf", "9.19", None), ("91", "9.19", None)):
+            with self.subTest(lat=lat, lon=lon, radius=radius):
+                self.assertEqual(get_nearby_stops(lat, lon, radius)[2], 400)
+
+    def test_nearby_results_are_sorted_with_distances(self):
+        fermate, _, status = get_nearby_stops("45.4642", "9.1900", "800", "15")
+        self.assertEqual(status, 200)
+        self.assertTrue(fermate)
+        distanze = [stop["distance"] for stop in fermate]
+        self.assertEqual(distanze, sorted(distanze))
+        self.assertLessEqual(distanze[-1], 800)
+
+    def test_bbox_parameter_validation(self):
+        self.assertEqual(get_stops(bbox="9.17,45.45,9.21,45.48")[2], 200)
+        self.assertEqual(get_stops(bbox="-1e308,-1e308,1e308,1e308")[2], 200)
+        for bbox in ("nan,45.45,9.21,45.48", "9.17,45.45,inf,45.48", "9.21,45.45,9.17,45.48", "1,2,3"):
+            with self.subTest(bbox=bbox):
+                self.assertEqual(get_stops(bbox=bbox)[2], 400)
+
+
+class SearchIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.index = StopsSearchIndex(StopsStore([
+            _stop("1", "P.Le Loreto Via Padova", "9.21", "45.48"),
+            _stop("2", "Loreto M1 M2", "9.21", "45.48", "metro"),
+            _stop("3", "V.Le Monza Via Erodoto", "9.22", "45.49"),
+            _stop("4", "Piazza Città Studi", "9.23", "45.47"),
+            _stop("5", "Loreto", "9.21", "45.48"),
+            _stop("6", "Via Padova Loreto", "9.22", "45.49"),
+        ]))
+
+    def _ids(self, query, limit=10):
+        return [stop["info"]["id"] for stop in self.index.search(query, limit)]
+
+    def test_normalization(self):
+        self.assertEqual(normalize_name("V.Le  Città-Studi"), "viale citta studi")
+        self.assertEqual(normalize_name("P.za Duomo"), "piazza duomo")
+        self.assertEqual(normalize_name("P.LE Loreto"), "piazzale loreto")
+
+    def test_prefix_ranking(self):
+        # Nome identico, poi nomi che iniziano con la query (i più corti prima), poi gli altri.
+        self.assertEqual(self._ids("loreto"), ["5", "2", "6", "1"])
+        self.assertEqual(self._ids("lor"), ["5", "2", "6", "1"])
+        self.assertEqual(self._ids("loreto", limit=2), ["5", "2"])
+
+    def test_every_query_word_must_prefix_a_name_word(self):
+        self.assertEqual(self._ids("padova lor"), ["6", "1"])
+        self.assertEqual(self._ids("viale monza"), ["3"])
+        self.assertEqual(self._ids("v.le monza"), ["3"])
+        self.assertEqual(self._ids("citta"), ["4"])
+
+    def test_fuzzy_matches_follow_prefix_matches(self):
+        self.assertEqual(self._ids("piazza citta studio"), ["4"])
+        self.assertEqual(self._ids("xyz"), [])
+        self.assertEqual(self._ids("  ...  "), [])
+
+
+if __name__ == "__main__":
+    unittest.main()